@@ -8,7 +8,6 @@ sys.path.append(parent_dir)
 
 # 基于顶层包的import
 from prototype.system_interface_remote import SystemInterfaceRemote
-from prototype.utils.network import recvLine
 
 # 系统库
 import time
@@ -27,13 +26,14 @@ def eval(SUBMITTER_NUM, RANDOMIZER_NUM, SUBTASK_NUM, RE_ENC_NUM, key_len):
     public_key_file = f"tmp/keypairs/pk{key_len}.pkl"
     private_key_file = f"tmp/keypairs/sk{key_len}.pkl"
 
-    def server(instruction, conn, addr):
-        if instruction == "event/TASK_END":
-            data = recvLine(conn)
+    def server(event):
+        if event.name == "TASK_END":
+            data = event.data
             print("elgamal_time", data)
             print("event/TASK_END")
             global ret
             global ret2
+            # 事件时间戳来自Requester所在主机的时钟，不能与本地时间相减，仍按收到的时间计算
             ret = time.time() - system.times["inited"]
             ret2 = data
             print("dur", ret)
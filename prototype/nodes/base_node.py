@@ -8,12 +8,14 @@ sys.path.append(parent_dir)
 
 # 基于顶层包的import
 from prototype.nodes.contract_interface import ContractInterface
-from prototype.utils.elgamal_encryptor import ElgamalEncryptor
+from prototype.utils.elgamal_encryptor import ElgamalEncryptor, PARALLEL_THRESHOLD
 from prototype.thirdparty import ipfshttpclient
-from prototype.utils.network import listen_on_port, connect_to, sendLine, recvLine
+from prototype.utils.aio_server import listen_on_port
+from prototype.utils.event_stream import EventEmitter, FLUSH_INTERVAL, BATCH_SIZE
+from prototype.utils import bigint, ipfs_transfer, log, network, rpc_codec, wire_format
+from prototype.utils.config import Config
 
 # 系统库
-import uuid
 import hashlib
 import pickle
 
@@ -40,54 +42,110 @@ class BaseNode:
         )
 
         # 初始化密码学模块
+        log.info(f"【{type(self).__name__}】bigint backend: {bigint.self_check()}")
         self.encryptor = ElgamalEncryptor(requester_pk_str, requester_sk_str)
+        table_cache_dir = Config().get_config("crypto").get("table_cache_dir")
+        elapsed = self.encryptor.precomputeTables(table_cache_dir)
+        log.info(
+            f"【{type(self).__name__}】fixed-base tables ready in {elapsed:.3f}s "
+            f"(cache: {table_cache_dir})"
+        )
+
+        # 接收帧的长度上限和消息编码
+        network_config = Config().get_config("network")
+        network.configure(network_config)
+        # 密文可直接作为消息发送（如重加密证明中的e'），按群元素编码，不含公钥
+        rpc_codec.register(
+            rpc_codec.CIPHERTEXT,
+            self.encryptor.scheme.Ciphertext,
+            self.encryptor.packCiphertext,
+            lambda version, value: self.encryptor.createCiphertext(value),
+        )
 
         # 初始化IPFS交互模块
-        self.ipfs_client = ipfshttpclient.connect(ipfs_url)
+        self.ipfs_client = ipfshttpclient.connect(
+            ipfs_url, chunk_size=ipfs_transfer.CHUNK_SIZE
+        )
+        transfer = Config().get_config("app").get("ipfs_transfer") or "memory"
+        self.ipfs_submit, self.ipfs_fetch = ipfs_transfer.TRANSFERS[transfer]
 
         # 初始化其它参数
         self.serving_port = serving_port
         self.client_port = client_port
         self.client_ip = client_ip
 
-    # 发送事件通知客户端
+        # 发送给客户端的事件经一条长连接批量发送
+        self.events = EventEmitter(
+            f"{type(self).__name__}-{serving_port}",
+            client_ip,
+            client_port,
+            network_config.get("event_flush_interval") or FLUSH_INTERVAL,
+            network_config.get("event_batch_size") or BATCH_SIZE,
+        )
+
+    # 按配置启动多进程加解密（进程数为1时不启用）
+    def _start_crypto_executor(self):
+        crypto_config = Config().get_config("crypto")
+        # 默认不启用（留空或0同1）：同一主机上的每个节点进程都会创建自己的进程池
+        workers = crypto_config.get("parallel_workers") or 1
+        if workers < 0:
+            raise ValueError(f"parallel_workers should not be negative: {workers}")
+        if workers > 1:
+            threshold = crypto_config.get("parallel_threshold") or PARALLEL_THRESHOLD
+            self.encryptor.startExecutor(workers, threshold)
+            log.info(
+                f"【{type(self).__name__}】parallel crypto enabled: "
+                f"{workers} workers, threshold {threshold} blocks"
+            )
+
+    # 本节点的密码学操作统计（供serving端口的get/crypto_metrics查询）
+    def crypto_metrics(self):
+        return {
+            "role": type(self).__name__,
+            "key_bits": self.encryptor.pk.iNumBits,
+            "operations": self.encryptor.metricsSnapshot(),
+            "pool": self.encryptor.poolStats(),
+        }
+
+    # 发送事件通知客户端（记录产生时间，不等待发送完成）
     def emit_event(self, event, data=None):
-        def handler(conn):
-            sendLine(conn, f"event/{event}")
-            if data is not None:
-                sendLine(conn, data)
-            conn.close()
-
-        connect_to(handler, self.client_port, self.client_ip)
-
-    def fetch_ipfs(self, file_pointer):
-        # 从分布式文件存储服务获取文件
-        download_path = "tmp/IPFS_downloads"
-        self.ipfs_client.get(file_pointer, download_path)
-        with open(f"{download_path}/{file_pointer}", "rb") as f:
-            file_content = f.read()
+        self.events.emit(event, data)
+
+    def fetch_ipfs(self, file_pointer, raw=False):
+        # 从分布式文件存储服务获取文件（raw为True时直接返回字节串）
+        try:
+            file_content = self.ipfs_fetch(self.ipfs_client, file_pointer)
+        except MemoryError:
+            # 文件过大无法整体放入内存时经磁盘下载
+            file_content = ipfs_transfer.get_file(self.ipfs_client, file_pointer)
+        if raw:
+            return file_content
         return pickle.loads(file_content)
 
-    def submit_ipfs(self, object):
-        # 向分布式文件存储服务上传python对象
-        uuid.uuid1()
-        tmp_file = f"tmp/{uuid.uuid1()}"
-        with open(tmp_file, "wb") as f:
-            f.write(pickle.dumps(object))
-        file_hash = self.ipfs_client.add(tmp_file)["Hash"]
-        # 删除临时文件
-        if os.path.exists(tmp_file):
-            os.remove(tmp_file)
-        return file_hash
-
-    # 生成数据的承诺，这里用sha256哈希作为例子
+    def submit_ipfs(self, object, raw=False):
+        # 向分布式文件存储服务上传python对象（raw为True时object为字节串，直接上传）
+        data = object if raw else pickle.dumps(object)
+        try:
+            return self.ipfs_submit(self.ipfs_client, data)
+        except MemoryError:
+            return ipfs_transfer.add_file(self.ipfs_client, data)
+
+    def submit_ciphertexts(self, ciphertexts, proof=None):
+        # 上传密文向量（二进制格式），proof为随密文一同发布的非交互式重加密证明
+        return self.submit_ipfs(
+            wire_format.dumps(ciphertexts, self.encryptor.pk, proof), raw=True
+        )
+
+    def fetch_ciphertexts(self, file_pointer):
+        # 下载密文向量（ElGamal.CiphertextVector）及其附带的证明（没有则为None）
+        file = self.fetch_ipfs(file_pointer, raw=True)
+        return wire_format.loads(file, self.encryptor.pk)
+
+    # 生成密文列表的承诺，这里用其二进制编码的sha256哈希作为例子
     def _generate_commitment(self, contents):
-        tmp = ""
-        for content in contents:
-            tmp += str(content)
         # 创建哈希对象
         hash_obj = hashlib.new("sha256")
         # 更新哈希对象，这里需要确保数据是字节串
-        hash_obj.update(tmp.encode())
-        # 获取十六进制格式的哈希值
+        hash_obj.update(wire_format.dumps(contents, self.encryptor.pk))
+        # 获取哈希值
         return hash_obj.digest()
@@ -7,9 +7,12 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 # 基于顶层包的import
-from prototype.utils.network import listen_on_port, connect_to, sendLine, recvLine
+from prototype.utils.network import sendLine, recvLine
+from prototype.utils.aio_server import listen_on_port
+from prototype.utils.transport import connect_to
 from prototype.nodes.base_node import BaseNode
 from prototype.utils import log
+from prototype.utils.config import Config
 from prototype.utils.tools import find_next_element
 
 # 系统库
@@ -56,6 +59,8 @@ class Randomizer(Process, BaseNode):
         self.proving_server_port = self.init_paras["proving_server_port"]
         self.id = self.init_paras["id"]
         self.old_alpha_primes = {}
+        # 重加密证明模式：interactive（交互式）或non_interactive（随密文发布Fiat-Shamir证明）
+        self.proof_mode = Config().get_config("crypto").get("proof_mode") or "interactive"
 
         # 初始化用于存储子任务被选中Randomizers的字典
         self.selectedRandomizers = {}
@@ -76,6 +81,11 @@ class Randomizer(Process, BaseNode):
             self.init_paras["requester_pk_str"],
         )
 
+        # 启动随机数预计算池
+        pool_size = Config().get_config("crypto").get("pool_size") or 0
+        if pool_size > 0:
+            self.encryptor.startPool(pool_size)
+
     # 外部控制接口启动
     def run(self):
         # 初始化
@@ -89,6 +99,12 @@ class Randomizer(Process, BaseNode):
             instruction = recvLine(conn)
             if instruction == "get/gas_cost":
                 sendLine(conn, self.contract_interface.total_gas_cost)
+            # 获取随机数预计算池的命中情况
+            elif instruction == "get/pool_stats":
+                sendLine(conn, self.encryptor.poolStats())
+            # 获取各密码学操作的次数、分块数和耗时统计
+            elif instruction == "get/crypto_metrics":
+                sendLine(conn, self.crypto_metrics())
             conn.close()
 
         # 启动服务器
@@ -134,11 +150,16 @@ class Randomizer(Process, BaseNode):
 
         # 0.证明者接收验证请求，并从本地获取验证所需的信息
         commit = recvLine(conn)
-        alpha_prime = self.old_alpha_primes[commit]
+        alpha_prime = self.old_alpha_primes.get(commit)
+        if alpha_prime is None:
+            # 没有该结果的重加密随机数，以None代替e'明确告知，不再直接断开连接
+            log.error(f"【Randomizer】{self.id} unknown commitment {commit}")
+            sendLine(conn, None)
+            return
 
         # 1.证明者发送e_prime，并保存alpha_tmp
         e_prime, alpha_tmp = self.encryptor.proveReEncrypt_1()
-        sendLine(conn, str(e_prime))
+        sendLine(conn, e_prime)
 
         # 2.接收验证者发送的挑战c，并构造和发送beta
         c = recvLine(conn)
@@ -187,17 +208,22 @@ class Randomizer(Process, BaseNode):
 
     def __perform_re_encryption(self, task_id, filehash):
         # 1.根据智能合约中存储的pointer，从分布式文件存储服务下载回答密文
-        file = self.fetch_ipfs(filehash)
-        ciphertexts = [self.encryptor.createCiphertext(c) for c in file]
-
-        # 2.进行重加密
-        alpha_prime = self.encryptor.genAlpha()
-        new_ciphertexts = self.encryptor.reEncrypt(ciphertexts, alpha_prime)
-
-        # 3.提交重加密结果
-        file_hash = self.submit_ipfs([str(c) for c in new_ciphertexts])
-
-        # 4.在本地保存一份结果 用于后续验证
+        ciphertexts, _ = self.fetch_ciphertexts(filehash)
+
+        # 2.进行重加密（随机数及E(0, alpha_prime)优先取自预计算池）
+        alpha_prime, zero = self.encryptor.takeRandomness()
+        new_ciphertexts = self.encryptor.reEncrypt(ciphertexts, alpha_prime, zero)
+
+        # 3.提交重加密结果（非交互模式下附带重加密证明）
+        proof = None
+        if self.proof_mode == "non_interactive":
+            proof = self.encryptor.proveReEncryptNI(
+                new_ciphertexts, ciphertexts, alpha_prime
+            )
+        file_hash = self.submit_ciphertexts(new_ciphertexts, proof)
+
+        # 4.在本地保存一份结果 用于后续交互式验证
+        # 非交互模式下也保存，Requester仍按交互模式配置时同样可以完成验证
         commit = self._generate_commitment(new_ciphertexts)
         self.old_alpha_primes[commit] = alpha_prime
 
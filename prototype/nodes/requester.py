@@ -7,10 +7,14 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 # 基于顶层包的import
-from prototype.utils.network import listen_on_port, connect_to, sendLine, recvLine
+from prototype.utils.network import sendLine, recvLine
+from prototype.utils.aio_server import listen_on_port
+from prototype.utils.transport import connect_to
 from prototype.nodes.base_node import BaseNode
 from prototype.task.task_interface import TaskInterface
+from prototype.task.task_lease import SubtaskLeases, LEASE_TTL
 from prototype.utils import log
+from prototype.utils.config import Config
 
 # 系统库
 import threading
@@ -77,10 +81,19 @@ class Requester(Process, BaseNode):
         self.randomizer_list = self.init_paras["randomizer_list"]
         self.task_pull_serving_port = self.init_paras["task_pull_serving_port"]
         self.task = self.init_paras["task"]
+        # 子任务租约表：Submitter批量租用子任务，到期未确认的重新分配
+        lease_ttl = Config().get_config("requester").get("task_lease_ttl") or LEASE_TTL
+        self.subtask_leases = SubtaskLeases(self.task, lease_ttl)
         self.randomizer_of_subtasks = {}  # subtaskid->使用的Randomizer列表
         self.answers_of_subtasks = Queue()  # 解密后的回答对象
+        self.pending_answers = []  # 待批量验证和解密的(subTaskId, 密文, 证明列表)
+        # 重加密证明模式：interactive（向Randomizer交互式请求）或non_interactive（随密文下载）
+        self.proof_mode = Config().get_config("crypto").get("proof_mode") or "interactive"
         self.task_queue = Queue()  # 待处理的事件队列
 
+        # 多核主机上启用多进程解密
+        self._start_crypto_executor()
+
     # 外部控制接口启动
     def run(self):
         # 初始化
@@ -94,6 +107,9 @@ class Requester(Process, BaseNode):
             instruction = recvLine(conn)
             if instruction == "get/gas_cost":
                 sendLine(conn, self.contract_interface.total_gas_cost)
+            # 获取各密码学操作的次数、分块数和耗时统计
+            elif instruction == "get/crypto_metrics":
+                sendLine(conn, self.crypto_metrics())
             conn.close()
 
         # 启动服务器
@@ -129,15 +145,31 @@ class Requester(Process, BaseNode):
         threading.Thread(target=self.__reward_dist_daemon).start()
 
     def __task_pull_server(self, conn, addr):
-        # 生成一个新的task 并返回
-        # 如果没有新的subtask了则返回None
-        subtask = self.task.get_subtasks()
-        st = time.time()
-        sendLine(conn, str(subtask))  # 将任务序列化后发送
-        # print("send time", time.time()-st)
+        # 请求：{"holder": Submitter标识, "ack": [已完成的lease_id], "renew": [续租的lease_id], "lease": 租用数量}
+        # 响应：{"ttl": 租约有效期, "renewed": [续租成功的lease_id], "subtasks": [(lease_id, 序列化的子任务)],
+        #       "done": 全部子任务均已完成}；subtasks为空且done为False时，稍后重试（可能有租约到期被收回）
+        request = recvLine(conn)
+        holder = request["holder"]
+        leases = self.subtask_leases
+        leases.ack(holder, request.get("ack", []))
+        renewed = leases.renew(holder, request.get("renew", []))
+        leased = leases.lease(holder, request.get("lease", 0))
+        sendLine(
+            conn,
+            {
+                "ttl": leases.ttl,
+                "renewed": renewed,
+                # 子任务只在首次分配时序列化，此后直接发送缓存的字节串
+                "subtasks": [(lease_id, task.encoded()) for lease_id, task in leased],
+                "done": not leased and leases.done(),
+            },
+        )
 
     def __task_handler_daemon(self):
         while True:
+            # 事件队列空闲时，将积压的回答一次性批量解密
+            if self.pending_answers and self.task_queue.empty():
+                self.__flush_answers()
             event_name, args = self.task_queue.get()
             if event_name == "SubTaskEncryptionCompleted":
                 # TODO：异常返回值处理 + 重加密者奖惩
@@ -158,33 +190,78 @@ class Requester(Process, BaseNode):
                         }
                     )
 
-                # 2. 从IPFS获取密文，并验证承诺
+                # 2. 从IPFS获取密文（及非交互式证明），并验证承诺
+                # 第i项为第i跳的结果（第0项为初始提交），与id_order按下标对应
                 ciphertext_list = []
-                for result in results:
-                    # 获取密文
-                    file = self.fetch_ipfs(result["filehash"])
-                    ciphertexts = [self.encryptor.createCiphertext(c) for c in file]
+                ni_proofs = []
+                failed_hop = None
+                for hop, result in enumerate(results):
+                    # 获取密文（格式错误或分量不在子群中时该跳无效）
+                    try:
+                        ciphertexts, proof = self.fetch_ciphertexts(result["filehash"])
+                    except ValueError as err:
+                        log.error(
+                            f"【Requester】invalid ciphertexts of {sub_task_id} "
+                            f"at hop {hop}: {err}"
+                        )
+                        failed_hop = hop
+                        break
 
                     # 验证承诺
                     commit = self._generate_commitment(ciphertexts)
                     if commit != result["commit"]:
-                        continue
+                        log.error(
+                            f"【Requester】commitment mismatch of {sub_task_id} "
+                            f"at hop {hop}"
+                        )
+                        failed_hop = hop
+                        break
                     ciphertext_list.append(ciphertexts)
+                    ni_proofs.append(proof)
+
+                if failed_hop is not None:
+                    # 重加密链在该跳断开，其后各跳无法逐跳验证，整个子任务的回答无效
+                    # 以None占位，__reward_dist_daemon按子任务数计数时不会缺少
+                    self.answers_of_subtasks.put((sub_task_id, None))
+                    continue
 
-                # 3.调用__verify_re_encryption验证重加密结果
-                verification_results = []
+                # 3.获取每一跳重加密的证明
+                proofs = []
                 id_order = ret[3]
                 for i in range(1, len(ciphertext_list)):
-                    valid = self.__verify_re_encryption(
-                        id_order[i - 1], ciphertext_list[i - 1], ciphertext_list[i]
-                    )
-                    verification_results.append(valid)
-                log.debug(
-                    f"【Requester】ZKP {sub_task_id} verification results {verification_results}"
-                )
-
-                # 4.调用__answer_collection解密重加密结果并保存
-                self.__answer_collection(sub_task_id, ciphertext_list[0])
+                    if self.proof_mode == "non_interactive":
+                        # 非交互模式：证明已随密文发布，离线展开即可
+                        proof = ni_proofs[i]
+                        if proof is None:
+                            # 缺少证明时构造一个必然验证失败的占位证明
+                            proof = (0, 0, 0)
+                        proofs.append(
+                            self.encryptor.expandReEncryptNI(
+                                ciphertext_list[i], ciphertext_list[i - 1], proof
+                            )
+                        )
+                    else:
+                        # 交互模式：调用__request_re_encryption_proof向Randomizer请求
+                        response = self.__request_re_encryption_proof(
+                            id_order[i - 1], ciphertext_list[i]
+                        )
+                        if response is None:
+                            # Randomizer无法提供证明，同样使用必然验证失败的占位证明
+                            proofs.append(
+                                self.encryptor.expandReEncryptNI(
+                                    ciphertext_list[i],
+                                    ciphertext_list[i - 1],
+                                    (0, 0, 0),
+                                )
+                            )
+                            continue
+                        e_prime, c, beta = response
+                        proofs.append(
+                            (ciphertext_list[i], ciphertext_list[i - 1], e_prime, c, beta)
+                        )
+
+                # 4.调用__answer_collection，批量验证证明、解密重加密结果并保存
+                self.__answer_collection(sub_task_id, ciphertext_list[0], proofs)
 
     def __handle_SubTaskAnswerSubmitted(self, raw_event, args):
         self.task_queue.put(("SubTaskAnswerSubmitted", args))
@@ -192,15 +269,18 @@ class Requester(Process, BaseNode):
     def __handle_SubTaskEncryptionCompleted(self, raw_event, args):
         self.task_queue.put(("SubTaskEncryptionCompleted", args))
 
-    def __verify_re_encryption(self, randomizer_id, ciphertext, new_ciphertext):
+    # 与Randomizer交互获取重加密证明(e', c, beta)，验证在__flush_answers中批量完成
+    def __request_re_encryption_proof(self, randomizer_id, new_ciphertext):
         def handler(conn):
             # 0.发送对特定重加密结果的验证请求
             commit = self._generate_commitment(new_ciphertext)
             sendLine(conn, commit)
 
-            # 1.接收证明者发送的e'
-            e_prime_str = recvLine(conn)
-            e_prime = self.encryptor.createCiphertext(e_prime_str)
+            # 1.接收证明者发送的e'（为None时证明者没有该结果的证明）
+            e_prime = recvLine(conn)
+            if e_prime is None:
+                conn.close()
+                return None
 
             # 2.验证者发送一个挑战c
             c = self.encryptor.proveReEncrypt_2()
@@ -212,21 +292,64 @@ class Requester(Process, BaseNode):
             return e_prime, c, beta
 
         randomizer_port, randomizer_ip = self.randomizer_list[randomizer_id]
-        e_prime, c, beta = connect_to(handler, randomizer_port, randomizer_ip)
-        valid = self.encryptor.verifyReEncrypt(
-            new_ciphertext, ciphertext, e_prime, c, beta
-        )
-        return valid
+        return connect_to(handler, randomizer_port, randomizer_ip)
 
     # 解密提交并保存，供后续奖励发放模块处理
-    def __answer_collection(self, subTaskId, ciphertexts):
-        # 1.使用自己的私钥解密submissions中的回答
-        ans_content = self.encryptor.decrypt(ciphertexts)
-        answer_obj = self.task.ANSWER_CLS().from_encoding(ans_content)
+    def __answer_collection(self, subTaskId, ciphertexts, proofs):
+        # 先加入待处理列表，由__flush_answers批量验证和解密
+        self.pending_answers.append((subTaskId, ciphertexts, proofs))
+
+    def __flush_answers(self):
+        pending, self.pending_answers = self.pending_answers, []
+
+        # 1.一次性批量验证所有子任务各跳的重加密证明
+        all_proofs = [proof for _, _, proofs in pending for proof in proofs]
+        all_results = self.encryptor.verifyReEncryptBatch(all_proofs)
+        offset = 0
+        verified = []
+        for subTaskId, _, proofs in pending:
+            verification_results = all_results[offset : offset + len(proofs)]
+            offset += len(proofs)
+            verified.append(all(verification_results))
+            log.debug(
+                f"【Requester】ZKP {subTaskId} verification results {verification_results}"
+            )
+
+        # 2.可同态累加的任务不逐个解密，直接交给__reward_dist_daemon累加
+        #   证明未通过或格式不符的回答以None占位，不参与累加
+        if self.task.homomorphic_bound() is not None:
+            for (subTaskId, ciphertexts, _), ok in zip(pending, verified):
+                if not ok:
+                    log.error(
+                        f"【Requester】proofs of {subTaskId} failed verification, ignored"
+                    )
+                    ciphertexts = None
+                elif len(ciphertexts) != 1:
+                    log.error(
+                        f"【Requester】{subTaskId} is not a homomorphic answer, ignored"
+                    )
+                    ciphertexts = None
+                self.answers_of_subtasks.put((subTaskId, ciphertexts))
+            return
+
+        # 使用自己的私钥批量解密submissions中的回答
+        # 无法解码的回答同样以None占位，__reward_dist_daemon按子任务数计数时不会缺少
+        contents = self.encryptor.decryptBatch([c for _, c, _ in pending])
+        for (subTaskId, _, _), ans_content in zip(pending, contents):
+            answer_obj = None
+            if ans_content is not None:
+                try:
+                    answer_obj = self.task.ANSWER_CLS().from_encoding(ans_content)
+                except ValueError:
+                    pass
+            if answer_obj is None:
+                log.error(
+                    f"【Requester】answer of {subTaskId} cannot be decoded, ignored"
+                )
 
-        # 2.将解密结果放入队列，供后续处理
-        self.answers_of_subtasks.put((subTaskId, answer_obj))
-        log.debug(f"【Requester】results {subTaskId} decrypted")
+            # 3.将解密结果放入队列，供后续处理
+            self.answers_of_subtasks.put((subTaskId, answer_obj))
+            log.debug(f"【Requester】results {subTaskId} decrypted")
 
     # 奖励发放器守护进程，评估结果并处理奖励发放相关事宜
     # TODO：完成随机延迟的奖励发放
@@ -236,17 +359,52 @@ class Requester(Process, BaseNode):
         # 3.使用随机延迟奖励发放算法给参与者发放奖励
         received_task_num = 0
         answers = []
+        bound = self.task.homomorphic_bound()
+        aggregate = None  # 同态模式下已收到回答的密文之和
         while True:
             received_task_num += 1
             if received_task_num > self.task.subtasks_num:
                 break
             subTaskId, answer_obj = self.answers_of_subtasks.get()
-            answers.append(answer_obj)
-
+            if answer_obj is None:
+                # 无效回答的占位，只计数
+                continue
+            if bound is not None:
+                # 同态模式：收到的是指数ElGamal密文，到达即累加
+                answers.append(answer_obj)
+                aggregate = answer_obj if aggregate is None else aggregate + answer_obj
+            else:
+                answers.append(answer_obj)
+
+        if bound is not None:
+            value = self.__decrypt_homomorphic(aggregate, answers, bound)
+            answers = [self.task.ANSWER_CLS().from_homomorphic_value(value)]
         indexes, answer = self.task.evaluation(answers)
         log.info(f"【Requester】final answer generated {answer} ")
         self.emit_event("TASK_END", self.encryptor.totaltime)
 
+    # 同态模式下解密回答之和：全部回答累加后只解密一次，
+    # 和超出上界（存在越界的回答）时逐个解密，丢弃越界或无效的回答
+    def __decrypt_homomorphic(self, aggregate, ciphertexts, bound):
+        if aggregate is None:
+            return 0
+        try:
+            return self.encryptor.decryptExp(aggregate, bound)
+        except ValueError:
+            log.error(
+                "【Requester】aggregate out of bound, decrypting answers one by one"
+            )
+        value = 0
+        for ciphertext in ciphertexts:
+            try:
+                v = self.encryptor.decryptExp(ciphertext, bound)
+            except ValueError:
+                log.error("【Requester】answer out of bound, ignored")
+                continue
+            if self.task.ANSWER_CLS().from_homomorphic_value(v).validate():
+                value += v
+        return value
+
 
 if __name__ == "__main__":
     # 导入测试所需的包
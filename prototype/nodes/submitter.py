@@ -7,16 +7,24 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 # 基于顶层包的import
-from prototype.utils.network import listen_on_port, connect_to, sendLine, recvLine
+from prototype.utils.network import sendLine, recvLine
+from prototype.utils.aio_server import listen_on_port
+from prototype.utils.transport import connect_to
 from prototype.nodes.base_node import BaseNode
 from prototype.utils import log
+from prototype.utils.config import Config
 from prototype.task.task_interface import SubTaskInterface
 
 # 系统库
 import threading
+import queue
 import random
+import time
 from multiprocessing import Process
 
+# 没有可租用的子任务（其余均被其它Submitter租用）时，重试的间隔（秒）
+LEASE_RETRY_INTERVAL = 1
+
 class Submitter(BaseNode, Process):
     # 构造函数
     def __init__(
@@ -60,6 +68,13 @@ class Submitter(BaseNode, Process):
         self.requester_ip = self.init_paras["requester_ip"]
         self.requester_task_pull_port = self.init_paras["requester_task_pull_port"]
         self.subtask_cls = self.init_paras["subtask_cls"]
+        # 每次租用的子任务数：执行当前子任务时预取下一批
+        self.task_prefetch = Config().get_config("submitter").get("task_prefetch") or 1
+        self.leased_subtasks = queue.Queue()  # 已租用、待执行的(lease_id, 子任务)，None表示全部完成
+        self.held_leases = set()  # 已租用、尚未确认完成的lease_id
+        self.completed_leases = []  # 已提交回答、待确认的lease_id
+        self.lease_lock = threading.Lock()
+        self.lease_wakeup = threading.Event()  # 本地队列取空或有待确认的子任务时唤醒预取线程
 
         # 基类初始化
         BaseNode.__init__(
@@ -76,6 +91,14 @@ class Submitter(BaseNode, Process):
             self.init_paras["requester_pk_str"],
         )
 
+        # 启动随机数预计算池
+        pool_size = Config().get_config("crypto").get("pool_size") or 0
+        if pool_size > 0:
+            self.encryptor.startPool(pool_size)
+
+        # 多核主机上启用多进程加密
+        self._start_crypto_executor()
+
     # 外部控制接口启动
     def run(self):
         # 初始化
@@ -90,6 +113,12 @@ class Submitter(BaseNode, Process):
             # 获取总gas开销
             elif instruction == "get/gas_cost":
                 sendLine(conn, self.contract_interface.total_gas_cost)
+            # 获取随机数预计算池的命中情况
+            elif instruction == "get/pool_stats":
+                sendLine(conn, self.encryptor.poolStats())
+            # 获取各密码学操作的次数、分块数和耗时统计
+            elif instruction == "get/crypto_metrics":
+                sendLine(conn, self.crypto_metrics())
             conn.close()
 
         # 启动服务器
@@ -101,45 +130,109 @@ class Submitter(BaseNode, Process):
 
     # 启动守护程序
     def daemon_start(self):
-        # 创建并启动一个新线程来运行主循环
+        # 预取线程租用子任务，主循环依次执行
+        threading.Thread(target=self.__prefetch_loop, daemon=True).start()
         thread = threading.Thread(target=self.__main_loop)
         thread.start()
 
     # submitter的主循环
     def __main_loop(self):
         while True:
-            self.subtask = self.pull_task()
-            log.debug(f"【Submitter】{self.id} task received")
-            if self.subtask == None:
+            item = self.leased_subtasks.get()
+            if item is None:
                 break
+            if self.leased_subtasks.empty():
+                # 当前批次已全部取出，执行最后一个子任务的同时预取下一批
+                self.lease_wakeup.set()
+            lease_id, self.subtask = item
+            log.debug(f"【Submitter】{self.id} task received")
             answer = self.subtask.execute()
             self.submit_answer(answer)
+            with self.lease_lock:
+                self.completed_leases.append(lease_id)
+            self.lease_wakeup.set()
             log.info(
                 f"【Submitter】{self.id} successed submitted answer of task {self.subtask.id}"
             )
 
-    # 从requester拉取众包任务
-    def pull_task(self):
+    # 预取线程：本地队列取空时租用下一批子任务，同时确认已完成的子任务，并在租约到期前续租
+    def __prefetch_loop(self):
+        renew_interval = None
+        last_renew = time.monotonic()
+        need_lease = True
+        while True:
+            # 先清除再读取状态，此后主循环的唤醒不会丢失
+            self.lease_wakeup.clear()
+            with self.lease_lock:
+                acks = self.completed_leases
+                self.completed_leases = []
+                self.held_leases.difference_update(acks)
+                held = list(self.held_leases)
+            renew_due = (
+                renew_interval is not None
+                and held
+                and time.monotonic() - last_renew >= renew_interval
+            )
+            if need_lease or acks or renew_due:
+                reply = self.pull_tasks(
+                    self.task_prefetch if need_lease else 0,
+                    acks,
+                    held if renew_due else [],
+                )
+                # 在租约有效期的三分之一处续租
+                renew_interval = reply["ttl"] / 3
+                if renew_due:
+                    last_renew = time.monotonic()
+                    lost = set(held) - set(reply["renewed"])
+                    if lost:
+                        log.error(
+                            f"【Submitter】{self.id} leases {sorted(lost)} expired "
+                            "before renewal and may be reassigned"
+                        )
+                if need_lease:
+                    if reply["done"]:
+                        self.leased_subtasks.put(None)
+                        return
+                    for lease_id, data in reply["subtasks"]:
+                        subtask = self.subtask_cls.from_str(bytes(data).decode("utf-8"))
+                        with self.lease_lock:
+                            self.held_leases.add(lease_id)
+                        self.leased_subtasks.put((lease_id, subtask))
+                    need_lease = not reply["subtasks"]
+                    if need_lease:
+                        # 其余子任务均被租用，等待它们完成或租约到期后重试
+                        time.sleep(LEASE_RETRY_INTERVAL)
+                        continue
+            self.lease_wakeup.wait(renew_interval)
+            if self.leased_subtasks.empty():
+                need_lease = True
+
+    # 与requester同步租约：确认acks、续租renew，并租用至多n个子任务，返回requester的响应
+    def pull_tasks(self, n, acks=(), renew=()):
         def handler(conn):
-            subtask_str = recvLine(conn)
-            conn.close()
-            return subtask_str
+            request = {
+                "holder": self.id,
+                "ack": list(acks),
+                "renew": list(renew),
+                "lease": n,
+            }
+            sendLine(conn, request)
+            return recvLine(conn)
 
-        subtask_str = connect_to(
-            handler, self.requester_task_pull_port, self.requester_ip
-        )
-        if subtask_str == "None":
-            return None
-        else:
-            return self.subtask_cls.from_str(subtask_str)
+        return connect_to(handler, self.requester_task_pull_port, self.requester_ip)
 
     # 提交回答（完成任务后调用）
     def submit_answer(self, answer):
         # 调用函数从回答中提取出内容，并加密和获取承诺
-        answer_ciphers = self.encryptor.encrypt(answer.encode())
+        # 可同态累加的回答以指数ElGamal加密其整数值，由Requester累加后统一解密
+        value = answer.homomorphic_value()
+        if value is not None:
+            answer_ciphers = self.encryptor.encryptExp(value)
+        else:
+            answer_ciphers = self.encryptor.encrypt(answer.encode())
         answer_commit = self._generate_commitment(answer_ciphers)
         # 上传区块链和IPFS
-        filehash = self.submit_ipfs([str(c) for c in answer_ciphers])
+        filehash = self.submit_ciphertexts(answer_ciphers)
         self.__submit_commit(answer_commit, filehash)
 
     def __submit_commit(self, commit, filehash):
@@ -12,7 +12,10 @@ from prototype.nodes.submitter import Submitter
 from prototype.nodes.randomizer import Randomizer
 from prototype.utils import log
 from prototype.utils.tools import deploy_smart_contract
-from prototype.utils.network import listen_on_port, connect_to, sendLine, recvLine
+from prototype.utils.config import Config
+from prototype.utils.network import sendLine, recvLine, configure
+from prototype.utils.aio_server import listen_on_port
+from prototype.utils.transport import connect_to
 from prototype.task.cifar10_tagging import CIFAR10Task
 
 # 系统库
@@ -31,6 +34,7 @@ import threading
 class Manager:
     def __init__(self, port):
         self.port = port
+        configure(Config().get_config("network"))
 
         # 所有节点
         self.requester = None
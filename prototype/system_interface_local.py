@@ -13,7 +13,9 @@ from prototype.nodes.randomizer import Randomizer
 from prototype.utils import log
 from prototype.utils.config import Config
 from prototype.utils.tools import deploy_smart_contract
-from prototype.utils.network import listen_on_port, connect_to, sendLine, recvLine
+from prototype.utils.network import sendLine, recvLine, configure
+from prototype.utils.event_stream import EventDispatcher
+from prototype.utils.transport import connect_to
 
 # 系统库
 import time
@@ -38,10 +40,10 @@ class SystemInterfaceLocal:
         self.server_callback = server_callback
         self.SUBMITTER_NUM = submitter_num
         self.RANDOMIZER_NUM = randomizer_num
-        self.RANDOMIZER_REGISTERED = 0
         self.SUBTASK_NUM = subtask_num
         self.RE_ENC_NUM = re_enc_num
         self.config = Config()
+        configure(self.config.get_config("network"))
 
         # 所有节点
         self.requester = None
@@ -128,20 +130,10 @@ class SystemInterfaceLocal:
     #     log.info(f"【Client】all nodes stoped  ...")
         
     def __server_start(self):
-        def server(conn, addr):
-            instruction = recvLine(conn)
-            # 先处理系统请求
-            if instruction == "event/RANDOMIZER_REGISTERED":
-                self.RANDOMIZER_REGISTERED += 1
-            # 处理用户请求
-            else:
-                self.server_callback(instruction, conn, addr)
-
-        # 启动服务器
-        threading.Thread(
-            target=listen_on_port,
-            args=(server, self.CLIENT_PORT),
-        ).start()
+        # 接收各节点的事件流，所有事件（utils.event_stream.Event）都交给server_callback
+        self.events = EventDispatcher(self.CLIENT_PORT)
+        self.events.on(None, self.server_callback)
+        self.events.start()
 
     def __start_all_nodes(self):
         # ------------------
@@ -156,10 +148,7 @@ class SystemInterfaceLocal:
 
         # 等待randomizer注册交易执行完成
         log.info(f"【Client】waiting for randomizers registering ...")
-        while True:
-            if self.RANDOMIZER_REGISTERED == self.RANDOMIZER_NUM:
-                break
-            time.sleep(1)
+        self.events.wait_for("RANDOMIZER_REGISTERED", self.RANDOMIZER_NUM)
         log.info(f"【Client】all randomizers registered")
 
     def __assign_bc_accounts(self):
@@ -314,8 +303,8 @@ class SystemInterfaceLocal:
 if __name__ == "__main__":
     from prototype.task.cifar10_tagging import CIFAR10Task
 
-    def server(instruction, conn, addr):
-        if instruction == "event/TASK_END":
+    def server(event):
+        if event.name == "TASK_END":
             print("event/TASK_END")
 
     # 启动分布式系统
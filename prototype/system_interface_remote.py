@@ -13,7 +13,9 @@ from prototype.nodes.randomizer import Randomizer
 from prototype.utils import log
 from prototype.utils.config import Config
 from prototype.utils.tools import deploy_smart_contract, ssh_command
-from prototype.utils.network import listen_on_port, connect_to, sendLine, recvLine
+from prototype.utils.network import sendLine, recvLine, configure
+from prototype.utils.event_stream import EventDispatcher
+from prototype.utils.transport import connect_to
 
 # 系统库
 import time
@@ -38,11 +40,11 @@ class SystemInterfaceRemote:
     ):
         # 其它参数
         self.config = Config()
+        configure(self.config.get_config("network"))
         self.task_name = task_name
         self.server_callback = server_callback
         self.SUBMITTER_NUM = submitter_num
         self.RANDOMIZER_NUM = randomizer_num
-        self.RANDOMIZER_REGISTERED = 0
         self.SUBTASK_NUM = subtask_num
         self.RE_ENC_NUM = re_enc_num
 
@@ -220,22 +222,12 @@ class SystemInterfaceRemote:
         )
 
     def __server_start(self):
-        def server(conn, addr):
-            instruction = recvLine(conn)
-            # 先处理系统请求
-            if instruction == "event/RANDOMIZER_REGISTERED":
-                self.RANDOMIZER_REGISTERED += 1
-            # 处理用户请求
-            else:
-                self.server_callback(instruction, conn, addr)
-                if instruction == "event/TASK_END":
-                    return "STOP"
-
-        # 启动服务器
-        threading.Thread(
-            target=listen_on_port,
-            args=(server, self.CLIENT_PORT, False),
-        ).start()
+        # 接收各节点的事件流，所有事件（utils.event_stream.Event）都交给server_callback
+        self.events = EventDispatcher(self.CLIENT_PORT)
+        self.events.on(None, self.server_callback)
+        # 任务结束后释放端口，供下一次实验使用
+        self.events.on("TASK_END", lambda event: self.events.stop())
+        self.events.start()
 
     def __assign_node_to_server(self):
         # ------------------
@@ -301,10 +293,7 @@ class SystemInterfaceRemote:
 
         # 等待Randomizer注册完成
         log.info(f"【Client】waiting for randomizers registering ...")
-        while True:
-            if self.RANDOMIZER_REGISTERED == self.RANDOMIZER_NUM:
-                break
-            time.sleep(1)
+        self.events.wait_for("RANDOMIZER_REGISTERED", self.RANDOMIZER_NUM)
         log.info(f"【Client】all randomizers registered")
         self.times["inited"] = time.time()
 
@@ -446,9 +435,10 @@ class SystemInterfaceRemote:
 if __name__ == "__main__":
     st = time.time()
 
-    def server(instruction, conn, addr):
-        if instruction == "event/TASK_END":
+    def server(event):
+        if event.name == "TASK_END":
             print("event/TASK_END")
+            # event.timestamp来自Requester所在主机的时钟，按本地收到的时间计算
             print("dur", time.time() - st)
 
     # TODO：执行命令 配置内网穿透（服务器1上）
@@ -8,7 +8,8 @@ sys.path.append(parent_dir)
 
 # 基于顶层包的import
 from utils.tools import split_array
-from task.task_interface import AnswerInterface, TaskInterface, SubTaskInterface
+from task.task_interface import TaskInterface, SubTaskInterface
+from task.packing import PackedAnswer
 
 # 系统库
 import json
@@ -21,11 +22,10 @@ import urllib.request
 from multiprocessing import Lock
 
 
-class CIFAR10Answer(AnswerInterface):
-    """任务回答"""
+class CIFAR10Answer(PackedAnswer):
+    """任务回答（0-9的标签列表，按每3个标签10比特紧凑编码）"""
 
-    def __init__(self, content: list):
-        self.content = content
+    SYMBOLS = 10
 
     def validate(self):
         # 对答案内容进行简单的有效性检查
@@ -34,15 +34,6 @@ class CIFAR10Answer(AnswerInterface):
                 return False
         return True
 
-    def encode(self):
-        encoded_bytes = bytes("".join(str(num) for num in self.content), "ascii")
-        return bytearray(encoded_bytes)
-
-    @classmethod
-    def from_encoding(cls, encoded):
-        decoded_int_array = [int(char) for char in encoded.decode("ascii")]
-        return cls(decoded_int_array)
-
     @classmethod
     def merge(self, answers):
         # 简单计算总回答数量
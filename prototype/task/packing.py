@@ -0,0 +1,117 @@
+# 添加当前路径至解释器，确保单元测试时可正常import其它文件
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# 基于顶层包的import
+from task.task_interface import AnswerInterface
+
+# 系统库
+import struct
+import numpy as np
+
+# 取值范围为[0, base)的符号序列的紧凑编码
+# 格式：4字节大端符号个数 + 位流
+# 每g个符号按base进制合成一个整数（组内低位在前），再以bits位定长写入位流
+# g和bits由base决定，使每个符号平均占用的比特数最少（如base=10时3个符号占10比特）
+HEADER = struct.Struct("!I")
+
+# 单组整数须能放入uint64
+MAX_GROUP_BITS = 64
+
+
+def group_layout(base):
+    """返回(每组符号数g, 每组比特数bits)"""
+    if base < 2:
+        raise ValueError(f"base should be at least 2, got {base}")
+    best = None
+    g = 1
+    while (base**g - 1).bit_length() <= MAX_GROUP_BITS:
+        bits = (base**g - 1).bit_length()
+        # 比较 bits/g，取平均比特数最少（相同时组最小）的方案
+        if best is None or bits * best[0] < best[1] * g:
+            best = (g, bits)
+        g += 1
+    return best
+
+
+def pack(values, base) -> bytearray:
+    """将取值范围为[0, base)的整数序列编码为字节串"""
+    values = np.asarray(values, dtype=np.int64).reshape(-1)
+    if values.size and (values.min() < 0 or values.max() >= base):
+        raise ValueError(f"values should be in [0, {base})")
+    g, bits = group_layout(base)
+    n = values.size
+    m = -(-n // g)
+    padded = np.zeros(m * g, dtype=np.uint64)
+    padded[:n] = values
+    weights = np.array([base**i for i in range(g)], dtype=np.uint64)
+    groups = padded.reshape(m, g) @ weights
+    # 每组按大端展开为bits个比特后统一打包
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.uint64)
+    bit_matrix = ((groups[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+    return bytearray(HEADER.pack(n)) + np.packbits(bit_matrix.reshape(-1)).tobytes()
+
+
+def unpack(data, base) -> list:
+    """将pack得到的字节串还原为整数列表"""
+    if len(data) < HEADER.size:
+        raise ValueError(f"truncated packed data: {len(data)} bytes")
+    (n,) = HEADER.unpack_from(data, 0)
+    g, bits = group_layout(base)
+    m = -(-n // g)
+    bit_stream = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=HEADER.size))
+    if bit_stream.size < m * bits:
+        raise ValueError(f"truncated packed data: {n} values need {m * bits} bits")
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.uint64)
+    groups = (bit_stream[: m * bits].reshape(m, bits).astype(np.uint64) << shifts).sum(
+        axis=1, dtype=np.uint64
+    )
+    weights = np.array([base**i for i in range(g)], dtype=np.uint64)
+    digits = ((groups[:, None] // weights) % np.uint64(base)).reshape(-1)
+    if digits[n:].any():
+        raise ValueError("non-zero padding in packed data")
+    return digits[:n].astype(np.int64).tolist()
+
+
+class PackedAnswer(AnswerInterface):
+    """以紧凑编码序列化的回答基类
+
+    子类将回答内容保存在self.content（取值范围为[0, SYMBOLS)的整数列表）中，
+    并设置SYMBOLS，即可继承encode/from_encoding
+    """
+
+    SYMBOLS = None
+
+    def __init__(self, content: list):
+        self.content = content
+
+    def encode(self):
+        return pack(self.content, self.SYMBOLS)
+
+    @classmethod
+    def from_encoding(cls, encoded):
+        return cls(unpack(encoded, cls.SYMBOLS))
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    for base in [2, 4, 10, 16, 100]:
+        values = [random.randrange(base) for _ in range(10007)]
+        encoded = pack(values, base)
+        assert unpack(encoded, base) == values
+        g, bits = group_layout(base)
+        print(
+            f"base {base}: {g} symbols per {bits} bits, "
+            f"{len(values)} values -> {len(encoded)} bytes"
+        )
+
+    values = [random.randrange(10) for _ in range(100000)]
+    st = time.time()
+    unpack(pack(values, 10), 10)
+    print(f"pack/unpack 100000 labels: {(time.time() - st) * 1000:.3f} ms")
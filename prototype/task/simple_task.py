@@ -33,6 +33,13 @@ class SimpleAnswer(AnswerInterface):
         content = int.from_bytes(encoded, byteorder='big', signed=True)
         return cls(content)
 
+    def homomorphic_value(self):
+        return self.content
+
+    @classmethod
+    def from_homomorphic_value(cls, value):
+        return cls(value)
+
     @classmethod
     def merge(self, answers):
         ret = 0
@@ -89,6 +96,10 @@ class SimpleTask(TaskInterface):
     def ANSWER_CLS(self):
         return SimpleAnswer
 
+    def homomorphic_bound(self):
+        # 各子任务回答之和不超过数据集的大小
+        return len(self.data) + 1
+
     def __create_subtasks(self, num):
         splited_tasks = split_array(self.data, num)
         return [
@@ -23,6 +23,15 @@ class AnswerInterface(ABC):
         '''聚合Answer对象'''
         pass
 
+    def homomorphic_value(self):
+        '''可同态累加的回答返回其非负整数值（以指数ElGamal加密），否则返回None'''
+        return None
+
+    @classmethod
+    def from_homomorphic_value(cls, value):
+        '''从同态累加后解密得到的整数还原回答'''
+        raise NotImplementedError
+
 class SubTaskInterface(ABC):
     @abstractmethod
     def execute(self, subtask):
@@ -40,6 +49,13 @@ class SubTaskInterface(ABC):
         '''从字符串初始化任务对象'''
         pass
 
+    def encoded(self):
+        '''str(self)的UTF-8编码，首次调用时计算并缓存，重复分配时直接发送该字节串'''
+        cached = self.__dict__.get("_encoded")
+        if cached is None:
+            cached = self._encoded = str(self).encode("utf-8")
+        return cached
+
 class TaskInterface(ABC):
     @property
     @abstractmethod
@@ -67,4 +83,8 @@ class TaskInterface(ABC):
     @abstractmethod
     def evaluation(self, answers):
         """输入一轮中的所有回答，评估它们的正确性，并返回各回答正确与否和最终聚合的结果"""
-        pass
\ No newline at end of file
+        pass
+
+    def homomorphic_bound(self):
+        """回答可同态累加时返回全部回答之和的上界（不含），Requester据此只解密一次；否则返回None"""
+        return None
\ No newline at end of file
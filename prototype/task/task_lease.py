@@ -0,0 +1,169 @@
+# 添加当前路径至解释器，确保单元测试时可正常import其它文件
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# 基于顶层包的import
+from task.task_interface import TaskInterface
+
+# 系统库
+import collections
+import threading
+import time
+
+# 租约的默认有效期（秒），持有者需在到期前续租
+LEASE_TTL = 120
+
+
+class SubtaskLeases:
+    """Requester端的子任务租约表
+
+    Submitter一次租用至多n个子任务，租约到期前须续租，完成（提交回答）后确认；
+    到期未确认的子任务收回后重新分配给其它Submitter
+    租约按分配顺序编号（lease_id），同一子任务对象可能在任务中出现多次，不以子任务id区分
+    """
+
+    def __init__(self, task: TaskInterface, ttl=LEASE_TTL):
+        self.task = task
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.leases = {}  # lease_id -> [持有者, 到期时间, 子任务]
+        self.expired = collections.deque()  # 已收回、待重新分配的(lease_id, 子任务)
+        self.exhausted = False  # task.get_subtasks()已返回None
+        self.reissued = 0  # 到期后重新分配的次数
+
+    def __reclaim(self, now):
+        for lease_id, (holder, deadline, subtask) in list(self.leases.items()):
+            if deadline <= now:
+                del self.leases[lease_id]
+                self.expired.append((lease_id, subtask))
+
+    def lease(self, holder, n):
+        """为holder租用至多n个子任务，返回[(lease_id, 子任务)]"""
+        now = time.monotonic()
+        ret = []
+        with self.lock:
+            self.__reclaim(now)
+            while len(ret) < n:
+                if self.expired:
+                    lease_id, subtask = self.expired.popleft()
+                    self.reissued += 1
+                elif not self.exhausted:
+                    subtask = self.task.get_subtasks()
+                    if subtask is None:
+                        self.exhausted = True
+                        continue
+                    lease_id = self.next_id
+                    self.next_id += 1
+                else:
+                    break
+                self.leases[lease_id] = [holder, now + self.ttl, subtask]
+                ret.append((lease_id, subtask))
+        return ret
+
+    def renew(self, holder, lease_ids):
+        """延长holder仍持有的租约，返回续租成功的lease_id（已到期被收回的不在其中）"""
+        now = time.monotonic()
+        renewed = []
+        with self.lock:
+            self.__reclaim(now)
+            for lease_id in lease_ids:
+                lease = self.leases.get(lease_id)
+                if lease is not None and lease[0] == holder:
+                    lease[1] = now + self.ttl
+                    renewed.append(lease_id)
+        return renewed
+
+    def ack(self, holder, lease_ids):
+        """确认子任务已完成；即使租约已到期，回答也已提交，不再重新分配"""
+        with self.lock:
+            for lease_id in lease_ids:
+                if lease_id in self.leases:
+                    del self.leases[lease_id]
+                else:
+                    self.expired = collections.deque(
+                        item for item in self.expired if item[0] != lease_id
+                    )
+
+    def done(self):
+        """全部子任务均已分配且确认"""
+        with self.lock:
+            self.__reclaim(time.monotonic())
+            return self.exhausted and not self.leases and not self.expired
+
+    def stats(self):
+        with self.lock:
+            return {
+                "leased": self.next_id,
+                "outstanding": len(self.leases),
+                "expired": len(self.expired),
+                "reissued": self.reissued,
+            }
+
+
+if __name__ == "__main__":
+    # 对比原有的每次新建连接拉取一个子任务（每次str+pickle）与经复用连接批量租用（子任务只序列化一次）
+    sys.path.append(os.path.dirname(parent_dir))
+    from prototype.utils import network, transport
+    from task.simple_task import SimpleTask, SimpleSubtask
+
+    subtasks_num = 2000
+    data = list(range(200000))
+    PORT = 44447
+
+    def old_server(conn, addr):
+        network.sendLine(conn, str(old_task.get_subtasks()))
+        conn.close()
+
+    def lease_server(conn, addr):
+        request = network.recvLine(conn)
+        leases.ack(request["holder"], request["ack"])
+        leased = leases.lease(request["holder"], request["lease"])
+        network.sendLine(conn, [(lease_id, s.encoded()) for lease_id, s in leased])
+
+    # 原协议由服务端先发送，只能串行处理（不经过按首字节判断协议的分派）
+    for handler, port, is_async in [
+        (old_server, PORT, False),
+        (lease_server, PORT + 1, True),
+    ]:
+        threading.Thread(
+            target=network.listen_on_port, args=(handler, port, is_async), daemon=True
+        ).start()
+    time.sleep(0.2)
+
+    def old_pull(conn):
+        return network.recvLine(conn)
+
+    network.set_codec("pickle")
+    old_task = SimpleTask("bench", data, subtasks_num)
+    st = time.perf_counter()
+    while network.connect_to(old_pull, PORT) != "None":
+        pass
+    old_time = time.perf_counter() - st
+    print(f"one per connection: {old_time / subtasks_num * 1e6:.1f} us per subtask")
+
+    network.set_codec("binary")
+    for batch in [1, 8, 32]:
+        leases = SubtaskLeases(SimpleTask("bench", data, subtasks_num))
+        acks = []
+
+        def lease_pull(conn):
+            network.sendLine(conn, {"holder": "bench", "ack": acks, "lease": batch})
+            return network.recvLine(conn)
+
+        st = time.perf_counter()
+        while True:
+            leased = transport.connect_to(lease_pull, PORT + 1)
+            if not leased:
+                break
+            for _, encoded in leased:
+                SimpleSubtask.from_str(encoded.decode("utf-8"))
+            acks = [lease_id for lease_id, _ in leased]
+        new_time = time.perf_counter() - st
+        assert leases.done()
+        per_subtask = new_time / subtasks_num * 1e6
+        print(f"leased, batch {batch:>2}: {per_subtask:.1f} us per subtask")
@@ -0,0 +1,454 @@
+# 基于asyncio的服务端，替代每个连接一个线程的network.listen_on_port
+# 所有连接的读写都在一个事件循环中完成，处理函数的并发数由max_concurrency限制
+#
+# 处理函数的约定与listen_on_port相同，即handler(conn, addr)：
+#   普通函数：在大小为max_concurrency的线程池中运行，conn实现sendall/recv/recv_into/close，
+#            可直接使用network.sendLine/recvLine，已有的处理函数无需修改
+#   协程函数：直接在事件循环中运行，conn实现协程read/write和close，配合本模块的recv_line/send_line使用
+# 同时支持原有的长度前缀协议和utils.transport的多路复用协议（按首字节区分）
+
+# 基于顶层包的import
+from prototype.utils import framing, log, network, transport
+from prototype.utils.config import Config
+
+# 系统库
+import asyncio
+import pickle
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认的处理函数并发上限（线程池大小）
+MAX_CONCURRENCY = 64
+
+# 停止服务时等待处理中的请求完成的最长时间（秒）
+SHUTDOWN_TIMEOUT = 10
+
+# 同步处理函数每次从事件循环读取的最大字节数，减少线程间往返
+READ_CHUNK = 64 * 1024
+
+
+async def recv_all(conn, length):
+    """接收指定长度的数据"""
+    data = bytearray()
+    while len(data) < length:
+        more = await conn.read(length - len(data))
+        if not more:
+            raise EOFError(
+                f"socket closed {len(data)} bytes into a {length}-byte message"
+            )
+        data += more
+    return data
+
+
+async def recv_line(conn):
+    """接收一行数据，以长度为前缀（与network.recvLine格式相同）"""
+    (length,) = framing.HEADER.unpack(await recv_all(conn, framing.HEADER.size))
+    if length == framing.ESCAPE:
+        (length,) = framing.LONG_HEADER.unpack(
+            await recv_all(conn, framing.LONG_HEADER.size)
+        )
+    max_size = network.MAX_FRAME_SIZE
+    if max_size is not None and length > max_size:
+        raise framing.FrameTooLarge(
+            f"{length}-byte frame exceeds the {max_size}-byte limit"
+        )
+    line = await recv_all(conn, length)
+    try:
+        return network.decode_message(conn, line)
+    except pickle.UnpicklingError:
+        return bytes(line)
+
+
+async def send_line(conn, data):
+    """发送一行数据，以长度为前缀（与network.sendLine格式相同）"""
+    try:
+        serialized_data = network.encode_message(conn, data)
+    except TypeError:
+        serialized_data = data
+    await conn.write(framing.header(len(serialized_data)) + serialized_data)
+
+
+class AsyncSocket:
+    """长度前缀协议的连接，prefix为判断协议时已读出的字节"""
+
+    def __init__(self, reader, writer, prefix=b""):
+        self.reader = reader
+        self.writer = writer
+        self.prefix = prefix
+
+    async def read(self, n):
+        if self.prefix:
+            data, self.prefix = self.prefix[:n], self.prefix[n:]
+            return data
+        return await self.reader.read(n)
+
+    async def write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def write_nowait(self, data):
+        self.writer.write(data)
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncStream:
+    """多路复用连接上的一个流"""
+
+    def __init__(self, mux, stream_id):
+        self.mux = mux
+        self.stream_id = stream_id
+        self.buffer = bytearray()
+        self.readable = asyncio.Event()
+        self.remote_closed = False
+        self.local_closed = False
+
+    def feed(self, data):
+        self.buffer += data
+        self.readable.set()
+
+    def remote_close(self):
+        self.remote_closed = True
+        self.readable.set()
+
+    async def read(self, n):
+        while not self.buffer and not self.remote_closed:
+            self.readable.clear()
+            await self.readable.wait()
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+    async def write(self, data):
+        self.write_nowait(data)
+        await self.mux.writer.drain()
+
+    def write_nowait(self, data):
+        if self.local_closed:
+            raise OSError(f"stream {self.stream_id} is closed")
+        self.mux.write_frame(transport.DATA, self.stream_id, data)
+
+    def close(self):
+        if self.local_closed:
+            return
+        self.local_closed = True
+        self.mux.streams.pop(self.stream_id, None)
+        if not self.mux.writer.is_closing():
+            self.mux.write_frame(transport.CLOSE, self.stream_id)
+
+
+class AsyncMux:
+    """服务端的多路复用连接：在事件循环中读帧，每个新流作为一次请求交给服务端处理"""
+
+    def __init__(self, server, reader, writer, addr):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.addr = addr
+        self.streams = {}
+        self.max_remote_id = 0
+
+    def write_frame(self, frame_type, stream_id, payload=b""):
+        header = transport.FRAME.pack(frame_type, stream_id, len(payload))
+        self.writer.write(header)
+        if payload:
+            self.writer.write(payload)
+
+    async def run(self):
+        try:
+            while True:
+                frame_type, stream_id, length = transport.FRAME.unpack(
+                    await asyncio.wait_for(
+                        self.reader.readexactly(transport.FRAME.size),
+                        transport.KEEPALIVE_TIMEOUT,
+                    )
+                )
+                payload = await self.reader.readexactly(length) if length else b""
+                if frame_type == transport.DATA:
+                    stream = self.streams.get(stream_id)
+                    if stream is not None:
+                        stream.feed(payload)
+                elif frame_type == transport.OPEN:
+                    if stream_id > self.max_remote_id:
+                        self.max_remote_id = stream_id
+                        stream = AsyncStream(self, stream_id)
+                        self.streams[stream_id] = stream
+                        self.server.spawn(stream, self.addr)
+                elif frame_type == transport.CLOSE:
+                    stream = self.streams.get(stream_id)
+                    if stream is not None:
+                        stream.remote_close()
+                elif frame_type == transport.PING:
+                    self.write_frame(transport.PONG, 0)
+        finally:
+            for stream in list(self.streams.values()):
+                stream.remote_close()
+
+
+class BlockingConnection:
+    """供同步处理函数在工作线程中使用的连接，读写通过事件循环完成"""
+
+    def __init__(self, conn, loop):
+        self.conn = conn
+        self.loop = loop
+        self.buffer = b""
+
+    def __call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def sendall(self, data):
+        data = bytes(data)
+        if len(data) <= READ_CHUNK:
+            # 小数据不等待写完，事件循环按提交顺序写出
+            self.loop.call_soon_threadsafe(self.__write_nowait, data)
+        else:
+            self.__call(self.conn.write(data))
+
+    def __write_nowait(self, data):
+        try:
+            self.conn.write_nowait(data)
+        except OSError:
+            pass
+
+    def recv(self, bufsize):
+        if not self.buffer:
+            self.buffer = self.__call(self.conn.read(max(bufsize, READ_CHUNK)))
+        data, self.buffer = self.buffer[:bufsize], self.buffer[bufsize:]
+        return data
+
+    def recv_into(self, buffer, nbytes=0):
+        view = memoryview(buffer).cast("B")
+        data = self.recv(nbytes or len(view))
+        view[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.conn.close)
+
+
+class PrefixedSocket:
+    """同步处理函数使用的原始socket，先返回判断协议时已读出的字节"""
+
+    def __init__(self, sock, prefix):
+        self.sock = sock
+        self.prefix = prefix
+
+    def recv(self, bufsize):
+        if self.prefix:
+            data, self.prefix = self.prefix[:bufsize], self.prefix[bufsize:]
+            return data
+        return self.sock.recv(bufsize)
+
+    def recv_into(self, buffer, nbytes=0):
+        if self.prefix:
+            view = memoryview(buffer).cast("B")
+            data = self.recv(nbytes or len(view))
+            view[: len(data)] = data
+            return len(data)
+        return self.sock.recv_into(buffer, nbytes)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+class AsyncServer:
+    """asyncio服务端，serve_forever阻塞运行，shutdown可在任意线程调用
+
+    长度前缀协议的连接交给同步处理函数时，工作线程直接在原始socket上阻塞读写，不经过事件循环
+    """
+
+    def __init__(self, handler, port, max_concurrency=MAX_CONCURRENCY, host=""):
+        self.handler = handler
+        self.port = port
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.is_coroutine = asyncio.iscoroutinefunction(handler)
+        self.loop = None
+        self.timeout = SHUTDOWN_TIMEOUT
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.__stopping = None
+        self.__semaphore = None
+        self.__executor = None
+        self.__tasks = set()  # 处理中的请求
+        self.__connections = set()  # 所有打开的连接（socket）
+
+    def serve_forever(self):
+        try:
+            asyncio.run(self.__main())
+        finally:
+            self.ready.set()
+            self.stopped.set()
+
+    def start(self):
+        """在后台线程中运行，返回时已开始监听"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self.ready.wait()
+        return self
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """停止接受新连接，等待处理中的请求完成（最多timeout秒）后关闭所有连接"""
+        self.timeout = timeout
+        if self.loop is not None and not self.stopped.is_set():
+            self.loop.call_soon_threadsafe(self.__stopping.set)
+        self.stopped.wait()
+
+    async def __main(self):
+        self.loop = asyncio.get_running_loop()
+        self.__stopping = asyncio.Event()
+        self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+        if not self.is_coroutine:
+            self.__executor = ThreadPoolExecutor(self.max_concurrency)
+        listener = socket.create_server((self.host, self.port), backlog=1024)
+        listener.setblocking(False)
+        accepting = self.loop.create_task(self.__accept_loop(listener))
+        self.ready.set()
+        await self.__stopping.wait()
+
+        # 优雅停止：先关闭监听，再等待处理中的请求，超时后强制关闭所有连接
+        accepting.cancel()
+        listener.close()
+        if self.__tasks:
+            await asyncio.wait(set(self.__tasks), timeout=self.timeout)
+        for conn in list(self.__connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for task in list(self.__tasks):
+            task.cancel()
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __accept_loop(self, listener):
+        while True:
+            conn, addr = await self.loop.sock_accept(listener)
+            self.loop.create_task(self.__on_connect(conn, addr))
+
+    def spawn(self, conn, addr):
+        # 一次请求：受并发上限约束地运行处理函数，结束后关闭连接
+        task = self.loop.create_task(self.__run(conn, addr))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+        return task
+
+    async def __run(self, conn, addr):
+        try:
+            async with self.__semaphore:
+                if self.is_coroutine:
+                    await self.handler(conn, addr)
+                else:
+                    if not isinstance(conn, PrefixedSocket):
+                        conn = BlockingConnection(conn, self.loop)
+                    await self.loop.run_in_executor(
+                        self.__executor, self.handler, conn, addr
+                    )
+        except Exception as err:
+            log.error(f"【AsyncServer】handler error on port {self.port}: {err!r}")
+        finally:
+            conn.close()
+
+    async def __on_connect(self, conn, addr):
+        self.__connections.add(conn)
+        writer = None
+        try:
+            first = await self.loop.sock_recv(conn, 1)
+            if first == transport.MAGIC[:1]:
+                # 以0xff开头的也可能是超过4 GiB的帧（长度前缀为framing.ESCAPE）
+                while len(first) < len(transport.MAGIC):
+                    more = await self.loop.sock_recv(
+                        conn, len(transport.MAGIC) - len(first)
+                    )
+                    if not more:
+                        return
+                    first += more
+            if first == transport.MAGIC:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                reader, writer = await asyncio.open_connection(sock=conn)
+                await AsyncMux(self, reader, writer, addr).run()
+            elif first and self.is_coroutine:
+                reader, writer = await asyncio.open_connection(sock=conn)
+                await self.spawn(AsyncSocket(reader, writer, first), addr)
+            elif first:
+                conn.setblocking(True)
+                await self.spawn(PrefixedSocket(conn, first), addr)
+        except (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.__connections.discard(conn)
+            if writer is not None:
+                writer.close()
+            else:
+                conn.close()
+
+
+def listen_on_port(handler, port, isAsync=True, max_concurrency=None):
+    """用法与network.listen_on_port相同，阻塞运行
+
+    按配置network.server选择实现：asyncio（默认）或threaded（即network.listen_on_port）
+    """
+    network_config = Config().get_config("network")
+    if not isAsync or network_config.get("server") == "threaded":
+        return network.listen_on_port(handler, port, isAsync)
+    if max_concurrency is None:
+        max_concurrency = network_config.get("max_concurrency") or MAX_CONCURRENCY
+    AsyncServer(handler, port, max_concurrency).serve_forever()
+
+
+if __name__ == "__main__":
+    # 对比线程服务端与asyncio服务端：clients个客户端并发地各发起rounds次“新建连接-请求-响应”
+    import time
+
+    clients = 50
+    rounds = 40
+
+    def echo(conn, addr):
+        network.sendLine(conn, network.recvLine(conn))
+        conn.close()
+
+    async def async_echo(conn, addr):
+        await send_line(conn, await recv_line(conn))
+
+    def bench(port):
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            local = []
+            for i in range(rounds):
+                st = time.perf_counter()
+                with socket.create_connection(("localhost", port)) as sock:
+                    network.sendLine(sock, i)
+                    assert network.recvLine(sock) == i
+                local.append(time.perf_counter() - st)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        st = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - st
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        return len(latencies) / elapsed, p99 * 1000
+
+    threading.Thread(
+        target=network.listen_on_port, args=(echo, 44450), daemon=True
+    ).start()
+    sync_server = AsyncServer(echo, 44451).start()
+    async_server = AsyncServer(async_echo, 44452).start()
+    time.sleep(0.2)
+    for name, port in [
+        ("threaded", 44450),
+        ("asyncio (sync handler)", 44451),
+        ("asyncio (coroutine handler)", 44452),
+    ]:
+        rate, p99 = bench(port)
+        print(f"{name}: {rate:.0f} accepts/s, p99 {p99:.2f} ms")
+    sync_server.shutdown()
+    async_server.shutdown()
@@ -0,0 +1,126 @@
+# 字节串与ElGamal明文整数之间的编解码
+# 格式：4字节大端长度头 + 原始数据，补零至分块大小的整数倍后按块转为整数
+# 每块取 iNumBits//8 - 1 字节，保证整数小于p；整数整体加1，避免出现0（0的密文cm恒为0）
+
+import struct
+
+HEADER = struct.Struct("!I")
+
+
+def block_size(iNumBits):
+    """每个明文整数承载的字节数"""
+    return iNumBits // 8 - 1
+
+
+def encode(data, iNumBits) -> list:
+    """将字节串编码为明文整数列表"""
+    bs = block_size(iNumBits)
+    n = HEADER.size + len(data)
+    buf = bytearray((n + bs - 1) // bs * bs)
+    HEADER.pack_into(buf, 0, len(data))
+    buf[HEADER.size : n] = data
+    mv = memoryview(buf)
+    return [int.from_bytes(mv[i : i + bs], "big") + 1 for i in range(0, len(buf), bs)]
+
+
+def _block_bytes(z, bs):
+    # 合法的明文整数满足 0 < z <= 256^bs，被篡改的密文解密后可能越界
+    if not 0 < z <= 1 << (8 * bs):
+        raise ValueError(f"plaintext block out of range for {bs}-byte blocks")
+    return (z - 1).to_bytes(bs, "big")
+
+
+def decode(blocks, iNumBits) -> bytearray:
+    """将明文整数列表解码为原始字节串（按长度头截断），格式错误时抛出ValueError"""
+    bs = block_size(iNumBits)
+    buf = bytearray(len(blocks) * bs)
+    for i, z in enumerate(blocks):
+        buf[i * bs : (i + 1) * bs] = _block_bytes(z, bs)
+    if len(buf) < HEADER.size:
+        raise ValueError(f"truncated plaintext: {len(buf)} bytes")
+    (length,) = HEADER.unpack_from(buf, 0)
+    if HEADER.size + length > len(buf):
+        raise ValueError(f"truncated plaintext: {len(buf)} bytes, header {length}")
+    return buf[HEADER.size : HEADER.size + length]
+
+
+def decode_or_none(blocks, iNumBits):
+    """同decode，格式错误时返回None（批量解密时单个无效的回答不影响其它回答）"""
+    try:
+        return decode(blocks, iNumBits)
+    except ValueError:
+        return None
+
+
+def iter_encode(chunks, length, iNumBits):
+    """流式编码：逐块读取总长为length的字节片段，逐个产出明文整数"""
+    bs = block_size(iNumBits)
+    pending = bytearray(HEADER.pack(length))
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        pending += chunk
+        mv = memoryview(pending)
+        full = len(pending) // bs * bs
+        for i in range(0, full, bs):
+            yield int.from_bytes(mv[i : i + bs], "big") + 1
+        mv.release()
+        del pending[:full]
+    if total != length:
+        raise ValueError(f"stream length {total} does not match header {length}")
+    if pending:
+        yield int.from_bytes(pending.ljust(bs, b"\x00"), "big") + 1
+
+
+def iter_decode(blocks, iNumBits):
+    """流式解码：逐个读取明文整数，逐段产出原始字节"""
+    bs = block_size(iNumBits)
+    remaining = None
+    for z in blocks:
+        chunk = _block_bytes(z, bs)
+        if remaining is None:
+            (remaining,) = HEADER.unpack_from(chunk, 0)
+            chunk = chunk[HEADER.size :]
+        if remaining <= 0:
+            continue
+        chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+    if remaining is None or remaining > 0:
+        raise ValueError("truncated plaintext stream")
+
+
+if __name__ == "__main__":
+    # 与elgamal.py中原有encode/decode的对比测试
+    import os
+    import sys
+    import time
+
+    current_dir = os.path.dirname(__file__)
+    parent_dir = os.path.dirname(current_dir)
+    sys.path.append(parent_dir)
+    from utils import elgamal
+
+    data = bytearray(os.urandom(10000))
+    for iNumBits in [512, 1024, 2048]:
+        z = encode(data, iNumBits)
+        assert decode(z, iNumBits) == data
+        stream = iter_encode([data[:999], data[999:]], len(data), iNumBits)
+        assert b"".join(iter_decode(stream, iNumBits)) == data
+
+        rounds = 10
+        st = time.time()
+        for _ in range(rounds):
+            decode(encode(data, iNumBits), iNumBits)
+        new_time = (time.time() - st) / rounds
+
+        st = time.time()
+        for _ in range(rounds):
+            elgamal.decode(elgamal.encode(data, iNumBits), iNumBits)
+        old_time = (time.time() - st) / rounds
+
+        print(
+            f"{iNumBits}-bit, {len(data)} bytes: "
+            f"codec {new_time * 1000:.3f} ms, legacy {old_time * 1000:.3f} ms, "
+            f"speedup {old_time / new_time:.1f}x"
+        )
@@ -1,10 +1,40 @@
+# 添加当前路径至解释器，确保单元测试时可正常import其它文件
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# 基于顶层包的import
+from utils.bigint import mpz, powmod, invert, batch_invert, from_bytes_le, legendre
+from utils import codec, keygen
+
+import hashlib
 import json
+import mmap
+import struct
 
-from Crypto.Util.number import inverse as multiplicative_inverse
 from Crypto.Math.Primality import generate_probable_safe_prime
 from Crypto.Math.Numbers import Integer
-from Crypto.Random.random import randrange
+from Crypto.Random.random import randrange, getrandbits
 import random
+import threading
+
+# 短指数模式下零知识证明随机数额外附加的统计隐藏比特数
+PROOF_STAT_BITS = 128
+
+# 批量验证时随机线性组合权重的比特数（单次批量验证的可靠性误差约为2^-BATCH_WEIGHT_BITS）
+BATCH_WEIGHT_BITS = 64
+
+# 固定底数预计算表的窗口宽度（比特），每个底数约占用 ceil(bits/w) * 2^w 个整数
+FIXED_BASE_WINDOW = 6
+
+# 指数ElGamal解密所用小步大步表的磁盘缓存目录
+BSGS_CACHE_DIR = "tmp/bsgs"
+
+# 固定底数预计算表的磁盘缓存目录（同一主机上的节点进程通过mmap共享），None表示不缓存
+FIXED_BASE_CACHE_DIR = "tmp/fixed_base"
 
 
 # finds a primitive root for prime p
@@ -94,7 +124,7 @@ def SS(num, iConfidence):
     return True
 
 
-# find n bit prime
+# find n bit prime（旧版实现，已由utils.keygen替代，保留用于性能对比）
 def find_prime(iNumBits, iConfidence):
     # keep testing until one is found
     while 1:
@@ -117,6 +147,7 @@ def find_prime(iNumBits, iConfidence):
             return p
 
 
+# 旧版逐字节编码（已由utils.codec替代，保留用于性能对比）
 # encodes bytes to integers mod p.  reads bytes from file
 def encode(byte_array: bytearray, iNumBits) -> list:
     # z is the array of integers mod p
@@ -151,6 +182,7 @@ def encode(byte_array: bytearray, iNumBits) -> list:
     return z
 
 
+# 旧版逐字节解码（已由utils.codec替代，保留用于性能对比）
 # decodes integers to the original message bytes
 def decode(aiPlaintext, iNumBits) -> bytearray:
     # bytes array will hold the decoded original message bytes
@@ -198,13 +230,324 @@ def decode(aiPlaintext, iNumBits) -> bytearray:
     return decoded_bytearray
 
 
+class FixedBaseTable:
+    """固定底数的窗口预计算表，table[i][d] = base^(d * 2^(w*i)) mod p
+
+    求幂时只需按窗口取表相乘，省去全部平方运算
+    指定cache_dir时表以定宽整数写入磁盘文件并以只读mmap方式使用，
+    同一主机上使用相同公钥的节点进程共享同一份物理内存，且无需重复计算
+    """
+
+    # 缓存文件：头部 + rows * 2^w 个定宽小端整数（按行优先排列）
+    # 头部：魔数(4B) | 版本(1B) | 窗口宽度(1B) | 整数宽度(2B) | 行数(4B) | sha256(表体)(32B)
+    MAGIC = b"FBTB"
+    VERSION = 1
+    HEADER = struct.Struct("!4sBBHI32s")
+
+    def __init__(
+        self, base, p, exp_bits=None, window=FIXED_BASE_WINDOW, cache_dir=None
+    ):
+        self.base = base
+        self.p = p
+        self.window = window
+        self.exp_bits = exp_bits or p.bit_length()
+        self.mask = (1 << window) - 1
+        self.rows = (self.exp_bits + window - 1) // window
+        self.width = (p.bit_length() + 7) // 8
+        self.table = None  # 内存中的表（未使用磁盘缓存时）
+        self.buffer = None  # 磁盘缓存的只读映射
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, f"{self.digest()}.bin")
+            self.buffer = self.__load(path)
+        if self.buffer is None:
+            self.table = self.__compute()
+            if path is not None:
+                self.__save(path)
+                self.buffer = self.__load(path)
+                if self.buffer is not None:
+                    self.table = None
+
+    # 缓存文件名：由底数、模数、窗口宽度和行数唯一确定（内容寻址）
+    def digest(self):
+        h = hashlib.sha256(self.MAGIC)
+        h.update(struct.pack("!BHI", self.window, self.width, self.rows))
+        h.update(int(self.p).to_bytes(self.width, "big"))
+        h.update(int(self.base).to_bytes(self.width, "big"))
+        return h.hexdigest()[:32]
+
+    def __compute(self):
+        table = []
+        p = mpz(self.p)
+        b = mpz(self.base)
+        for _ in range(self.rows):
+            row = [1] * (1 << self.window)
+            for d in range(1, 1 << self.window):
+                row[d] = row[d - 1] * b % p
+            table.append(row)
+            b = row[-1] * b % p
+        return table
+
+    def __load(self, path):
+        # 头部、长度、校验和或首项不符时视为缓存失效，返回None后重新计算
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        body_size = self.rows * self.width << self.window
+        valid = len(buffer) == self.HEADER.size + body_size
+        if valid:
+            magic, version, window, width, rows, checksum = self.HEADER.unpack_from(
+                buffer, 0
+            )
+            valid = (magic, version, window, width, rows) == (
+                self.MAGIC,
+                self.VERSION,
+                self.window,
+                self.width,
+                self.rows,
+            )
+        if valid:
+            body = memoryview(buffer)[self.HEADER.size :]
+            valid = hashlib.sha256(body).digest() == checksum
+            body.release()
+        if valid:
+            offset = self.HEADER.size + self.width
+            first = from_bytes_le(buffer[offset : offset + self.width])
+            valid = first == self.base % self.p
+        if not valid:
+            buffer.close()
+            return None
+        return buffer
+
+    def __save(self, path):
+        # 先写临时文件再原子替换，避免多个进程同时写入时读到不完整的表
+        body = bytearray(self.rows * self.width << self.window)
+        offset = 0
+        for row in self.table:
+            for v in row:
+                body[offset : offset + self.width] = int(v).to_bytes(self.width, "little")
+                offset += self.width
+        header = self.HEADER.pack(
+            self.MAGIC,
+            self.VERSION,
+            self.window,
+            self.width,
+            self.rows,
+            hashlib.sha256(body).digest(),
+        )
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def pow(self, e):
+        # 超出预计算范围的指数退回普通的模幂
+        if e < 0 or e.bit_length() > self.exp_bits:
+            return powmod(self.base, e, self.p)
+        if self.table is None:
+            return self.__pow_mapped(e)
+        p = self.p
+        w = self.window
+        mask = self.mask
+        ret = mpz(1)
+        for row in self.table:
+            if not e:
+                break
+            d = e & mask
+            if d:
+                ret = ret * row[d] % p
+            e >>= w
+        return ret
+
+    def __pow_mapped(self, e):
+        # 与pow相同，表项直接从映射的缓存文件中读取
+        buffer = self.buffer
+        p = self.p
+        w = self.window
+        mask = self.mask
+        width = self.width
+        stride = width << w
+        offset = self.HEADER.size
+        ret = mpz(1)
+        while e:
+            d = e & mask
+            if d:
+                i = offset + d * width
+                ret = ret * from_bytes_le(buffer[i : i + width]) % p
+            e >>= w
+            offset += stride
+        return ret
+
+
+# 预计算表缓存，以(底数, 模数)为索引，同一进程内的所有公钥对象共享
+_fixed_base_tables = {}
+_fixed_base_lock = threading.Lock()
+_fixed_base_cache_dir = FIXED_BASE_CACHE_DIR
+
+
+def set_fixed_base_cache_dir(cache_dir):
+    """设置预计算表的磁盘缓存目录（None表示不使用磁盘缓存），只影响之后新建的表"""
+    global _fixed_base_cache_dir
+    _fixed_base_cache_dir = cache_dir
+
+
+def fixed_base_table(base, p):
+    table = _fixed_base_tables.get((base, p))
+    if table is None:
+        with _fixed_base_lock:
+            table = _fixed_base_tables.get((base, p))
+            if table is None:
+                table = FixedBaseTable(base, p, cache_dir=_fixed_base_cache_dir)
+                _fixed_base_tables[(base, p)] = table
+    return table
+
+
+def multi_exp(bases, exps, p, window=None):
+    """同时多幂运算 prod(bases[i]^exps[i]) mod p（Straus交错窗口法）
+
+    所有底数共享同一串平方运算，每个窗口只需为各底数查表相乘一次
+    """
+    pairs = [(b, e) for b, e in zip(bases, exps) if e]
+    if not pairs:
+        return mpz(1)
+    bits = max(e.bit_length() for _, e in pairs)
+    if window is None:
+        window = 4 if bits > 128 else 2
+    n = (bits + window - 1) // window
+    # 每个底数预计算 b^0 ... b^(2^w - 1)，并把指数拆成长度为w的窗口序列
+    tables = []
+    digits = []
+    for b, e in pairs:
+        if e < 0:
+            b, e = invert(b, p), -e
+        row = [mpz(1), mpz(b) % p]
+        for _ in range(2, 1 << window):
+            row.append(row[-1] * row[1] % p)
+        tables.append(row)
+        s = bin(e)[2:].zfill(n * window)
+        digits.append([int(s[i : i + window], 2) for i in range(0, n * window, window)])
+
+    ret = mpz(1)
+    for k in range(n):
+        if k:
+            for _ in range(window):
+                ret = ret * ret % p
+        for row, ds in zip(tables, digits):
+            d = ds[k]
+            if d:
+                ret = ret * row[d] % p
+    return ret
+
+
+class DiscreteLogTable:
+    """小步大步（baby-step giant-step）离散对数表，求解 g^x = y 中 0 <= x < m^2 的x
+
+    小步表只保存 g^j (0 <= j < m) 的低64比特，命中后再用一次模幂确认，
+    因此磁盘上的表即使损坏也只会导致求解失败而不会得到错误结果
+    """
+
+    MAGIC = b"BSGS"
+    VERSION = 1
+    HEADER = struct.Struct("!4sBI")
+    MASK = (1 << 64) - 1
+
+    def __init__(self, g, p, m, cache_dir=BSGS_CACHE_DIR):
+        self.g = mpz(g)
+        self.p = mpz(p)
+        self.m = m
+        path = None
+        if cache_dir is not None:
+            width = (self.p.bit_length() + 7) // 8
+            digest = hashlib.sha256(
+                int(self.p).to_bytes(width, "big") + int(self.g).to_bytes(width, "big")
+            ).hexdigest()[:16]
+            path = os.path.join(cache_dir, f"{digest}-{m}.bin")
+        keys = self.__load(path) if path is not None else None
+        if keys is None:
+            keys = []
+            y = mpz(1)
+            for _ in range(m):
+                keys.append(int(y & self.MASK))
+                y = y * self.g % self.p
+            if path is not None:
+                self.__save(path, keys)
+        self.baby_steps = {k: j for j, k in enumerate(keys)}
+        # 大步因子 g^-m
+        self.giant_step = invert(powmod(self.g, m, self.p), self.p)
+
+    def __load(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) != self.HEADER.size + 8 * self.m:
+            return None
+        magic, version, m = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or version != self.VERSION or m != self.m:
+            return None
+        return list(struct.unpack_from(f"!{m}Q", data, self.HEADER.size))
+
+    def __save(self, path, keys):
+        # 先写临时文件再原子替换，避免多个进程同时写入时读到不完整的表
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.m))
+                f.write(struct.pack(f"!{self.m}Q", *keys))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def log(self, y, bound):
+        """返回 0 <= x < bound 且 g^x = y 的x，不存在时抛出ValueError"""
+        target = mpz(y)
+        y = target
+        for i in range(-(-bound // self.m)):
+            j = self.baby_steps.get(int(y & self.MASK))
+            if j is not None:
+                x = i * self.m + j
+                if x < bound and powmod(self.g, x, self.p) == target:
+                    return x
+            y = y * self.giant_step % self.p
+        raise ValueError(f"discrete log not found within bound {bound}")
+
+
+# 离散对数表缓存，以(底数, 模数, 小步数)为索引
+_discrete_log_tables = {}
+_discrete_log_lock = threading.Lock()
+
+
+def discrete_log_table(g, p, bound):
+    # 小步数取不小于sqrt(bound)的2的幂，使相近的上界共用同一张表
+    m = 1 << ((max(bound, 2) - 1).bit_length() + 1) // 2
+    key = (g, p, m)
+    table = _discrete_log_tables.get(key)
+    if table is None:
+        with _discrete_log_lock:
+            table = _discrete_log_tables.get(key)
+            if table is None:
+                table = DiscreteLogTable(g, p, m)
+                _discrete_log_tables[key] = table
+    return table
+
+
 class ElGamal:
     class PrivateKey:
-        def __init__(self, p=None, g=None, x=None, iNumBits=None):
-            self.p = p
-            self.g = g
-            self.x = x
+        def __init__(self, p=None, g=None, x=None, iNumBits=None, q=None):
+            self.p = None if p is None else mpz(p)
+            self.g = None if g is None else mpz(g)
+            self.x = None if x is None else mpz(x)
             self.iNumBits = iNumBits
+            self.q = None if q is None else mpz(q)  # 子群模式下g的阶
 
         def __repr__(self):
             return f"ElGamal.PrivateKey(p={self.p}, g={self.g}, x={self.x})"
@@ -214,20 +557,37 @@ class ElGamal:
 
         def __str__(self):
             return json.dumps(
-                {"p": self.p, "g": self.g, "x": self.x, "iNumBits": self.iNumBits}
+                {
+                    "p": int(self.p),
+                    "g": int(self.g),
+                    "x": int(self.x),
+                    "iNumBits": self.iNumBits,
+                    "q": None if self.q is None else int(self.q),
+                }
             )
 
         @classmethod
         def from_str(cls, s):
             obj = json.loads(s)
-            return cls(obj["p"], obj["g"], obj["x"], obj["iNumBits"])
+            return cls(obj["p"], obj["g"], obj["x"], obj["iNumBits"], obj.get("q"))
 
     class PublicKey:
-        def __init__(self, p=None, g=None, h=None, iNumBits=None):
-            self.p = p
-            self.g = g
-            self.h = h
+        def __init__(
+            self, p=None, g=None, h=None, iNumBits=None, q=None, exp_bits=None
+        ):
+            self.p = None if p is None else mpz(p)
+            self.g = None if g is None else mpz(g)
+            self.h = None if h is None else mpz(h)
             self.iNumBits = iNumBits
+            # 子群模式：g生成阶为q=(p-1)/2的子群，指数模q约减
+            self.q = None if q is None else mpz(q)
+            # 短指数模式：随机数alpha只取exp_bits比特（需同时启用子群模式）
+            self.exp_bits = exp_bits
+
+        # 指数运算所在的模数
+        @property
+        def order(self):
+            return self.p - 1 if self.q is None else self.q
 
         def __repr__(self):
             return f"ElGamal.PublicKey(p={self.p}, g={self.g}, h={self.h})"
@@ -235,26 +595,86 @@ class ElGamal:
         def __eq__(self, pk):
             return self.p == pk.p and self.g == pk.g and self.h == pk.h
 
+        # 公钥指纹：sha256(p || g || h)，各值按p的字节宽度定长编码
+        def fingerprint(self) -> bytes:
+            cached = self.__dict__.get("_fingerprint")
+            if cached is None or cached[0] != (self.p, self.g, self.h):
+                width = (self.p.bit_length() + 7) // 8
+                h = hashlib.sha256()
+                for v in (self.p, self.g, self.h):
+                    h.update(int(v).to_bytes(width, "big"))
+                cached = ((self.p, self.g, self.h), h.digest())
+                self._fingerprint = cached
+            return cached[1]
+
+        # 该公钥所属的方案（ElGamal或ECElGamal），供按公钥分派的调用方使用
+        @property
+        def scheme(self):
+            return ElGamal
+
+        # 群元素的定长编码（按p的字节宽度），供wire_format使用
+        @property
+        def element_size(self):
+            return (self.p.bit_length() + 7) // 8
+
+        def encode_element(self, v) -> bytes:
+            return int(v).to_bytes(self.element_size, "big")
+
+        # subgroup为True时要求解码结果在子群中（如密文的cr、重加密证明的e'）
+        def decode_element(self, data, subgroup=False):
+            v = int.from_bytes(data, "big")
+            if not 0 < v < self.p:
+                raise ValueError("ciphertext component out of range")
+            if subgroup and not self.in_subgroup(v):
+                raise ValueError("ciphertext component is not in the subgroup")
+            return mpz(v)
+
+        # v是否属于g生成的阶为q=(p-1)/2的子群，即模p的二次剩余（p为安全素数）
+        def in_subgroup(self, v):
+            return legendre(v, self.p) == 1
+
+        # g^e mod p（基于固定底数预计算表）
+        def pow_g(self, e):
+            return fixed_base_table(self.g, self.p).pow(e)
+
+        # h^e mod p（基于固定底数预计算表）
+        def pow_h(self, e):
+            return fixed_base_table(self.h, self.p).pow(e)
+
         def __str__(self):
             return json.dumps(
-                {"p": self.p, "g": self.g, "h": self.h, "iNumBits": self.iNumBits}
+                {
+                    "p": int(self.p),
+                    "g": int(self.g),
+                    "h": int(self.h),
+                    "iNumBits": self.iNumBits,
+                    "q": None if self.q is None else int(self.q),
+                    "exp_bits": self.exp_bits,
+                }
             )
 
         @classmethod
         def from_str(cls, s):
             obj = json.loads(s)
-            return cls(obj["p"], obj["g"], obj["h"], obj["iNumBits"])
+            return cls(
+                obj["p"],
+                obj["g"],
+                obj["h"],
+                obj["iNumBits"],
+                obj.get("q"),
+                obj.get("exp_bits"),
+            )
 
     class Ciphertext:
         def __init__(self, cm, cr, pk):
-            self.cm = cm  # ciphertext with message
-            self.cr = cr  # ciphertext with random number
+            self.cm = mpz(cm)  # ciphertext with message
+            self.cr = mpz(cr)  # ciphertext with random number
             self.pk = pk  # the public key
 
         def __neg__(self):
             try:
-                new_cm = multiplicative_inverse(self.cm, self.pk.p)
-                new_cr = multiplicative_inverse(self.cr, self.pk.p)
+                new_cm = invert(self.cm, self.pk.p)
+                new_cr = invert(self.cr, self.pk.p)
             except:
                 print(self.cm, self.pk.p)
             return ElGamal.Ciphertext(new_cm, new_cr, self.pk)
@@ -278,14 +698,12 @@ class ElGamal:
 
         def __rmul__(self, scalar):
             if not isinstance(scalar, int):
-                ValueError("only scalar multiplication is allowed")
-            ret = ElGamal.Encrypt(self.pk, 0, 0)
-            # fast multiplication
-            for b in bin(scalar)[2:]:
-                ret = ret + ret
-                if b == "1":
-                    ret += self
-            return ret
+                raise ValueError("only scalar multiplication is allowed")
+            # 同态数乘 scalar * E(m) = (cm^scalar, cr^scalar)
+            p = self.pk.p
+            return ElGamal.Ciphertext(
+                powmod(self.cm, scalar, p), powmod(self.cr, scalar, p), self.pk
+            )
 
         def __eq__(self, e):
             return self.cm == e.cm and self.cr == e.cr and self.pk == e.pk
@@ -294,7 +712,9 @@ class ElGamal:
             return f"ElGamal.Ciphertext(cm={self.cm}, cr={self.cr}, pk={self.pk})"
 
         def __str__(self):
-            return json.dumps({"cm": self.cm, "cr": self.cr, "pk": str(self.pk)})
+            return json.dumps(
+                {"cm": int(self.cm), "cr": int(self.cr), "pk": str(self.pk)}
+            )
 
         @classmethod
         def from_str(cls, s):
@@ -302,79 +722,421 @@ class ElGamal:
             pk = ElGamal.PublicKey.from_str(obj["pk"])
             return cls(obj["cm"], obj["cr"], pk)
 
+    class CiphertextVector:
+        """密文向量：cm、cr分两列存储，整个向量共用一个公钥
+
+        用于一次回答的全部分块，公钥只在向量之间的运算时比较一次
+        """
+
+        __slots__ = ("cm", "cr", "pk")
+
+        def __init__(self, cm, cr, pk):
+            if len(cm) != len(cr):
+                raise ValueError("cm and cr columns should have the same length")
+            self.cm = [mpz(v) for v in cm]
+            self.cr = [mpz(v) for v in cr]
+            self.pk = pk
+
+        @classmethod
+        def _from_columns(cls, cm, cr, pk):
+            # 内部使用：列中已是mpz，跳过转换
+            obj = cls.__new__(cls)
+            obj.cm = cm
+            obj.cr = cr
+            obj.pk = pk
+            return obj
+
+        @classmethod
+        def of(cls, ciphertexts, pk=None):
+            # 将Ciphertext列表转换为密文向量（已是向量时原样返回）
+            if isinstance(ciphertexts, cls):
+                return ciphertexts
+            ciphertexts = list(ciphertexts)
+            if pk is None:
+                if not ciphertexts:
+                    raise ValueError("a public key is required for an empty vector")
+                pk = ciphertexts[0].pk
+            for c in ciphertexts:
+                if c.pk is not pk and c.pk != pk:
+                    raise ValueError("The public keys should be the same!")
+            return cls._from_columns(
+                [c.cm for c in ciphertexts], [c.cr for c in ciphertexts], pk
+            )
+
+        def __len__(self):
+            return len(self.cm)
+
+        def __iter__(self):
+            for cm, cr in zip(self.cm, self.cr):
+                yield ElGamal.Ciphertext(cm, cr, self.pk)
+
+        def __getitem__(self, i):
+            if isinstance(i, slice):
+                return ElGamal.CiphertextVector._from_columns(
+                    self.cm[i], self.cr[i], self.pk
+                )
+            return ElGamal.Ciphertext(self.cm[i], self.cr[i], self.pk)
+
+        def __eq__(self, e):
+            if not isinstance(e, ElGamal.CiphertextVector):
+                e = ElGamal.CiphertextVector.of(e, self.pk)
+            return self.cm == e.cm and self.cr == e.cr and self.pk == e.pk
+
+        def __repr__(self):
+            return f"ElGamal.CiphertextVector(len={len(self)}, pk={self.pk})"
+
+        def to_list(self) -> list:
+            return list(self)
+
+        def _check(self, e):
+            if self.pk is not e.pk and self.pk != e.pk:
+                raise ValueError("The public keys should be the same!")
+            if len(self) != len(e):
+                raise ValueError(f"vector length mismatch: {len(self)} != {len(e)}")
+
+        def __add__(self, e):
+            # the base case for built-in sum()
+            if isinstance(e, int) and e == 0:
+                return self[:]
+            # 逐分块同态相加
+            e = ElGamal.CiphertextVector.of(e, self.pk)
+            self._check(e)
+            p = self.pk.p
+            return ElGamal.CiphertextVector._from_columns(
+                [a * b % p for a, b in zip(self.cm, e.cm)],
+                [a * b % p for a, b in zip(self.cr, e.cr)],
+                self.pk,
+            )
+
+        def __radd__(self, e):
+            return self + e
+
+        def __neg__(self):
+            # 所有分块的cm、cr共享一次Montgomery批量求逆
+            n = len(self)
+            inverses = batch_invert(self.cm + self.cr, self.pk.p)
+            return ElGamal.CiphertextVector._from_columns(
+                inverses[:n], inverses[n:], self.pk
+            )
+
+        def __sub__(self, e):
+            return self + (-ElGamal.CiphertextVector.of(e, self.pk))
+
+        def mul(self, scalar):
+            # 逐分块同态数乘 scalar * E(m) = (cm^scalar, cr^scalar)
+            if not isinstance(scalar, int):
+                raise ValueError("only scalar multiplication is allowed")
+            p = self.pk.p
+            return ElGamal.CiphertextVector._from_columns(
+                [powmod(v, scalar, p) for v in self.cm],
+                [powmod(v, scalar, p) for v in self.cr],
+                self.pk,
+            )
+
+        def __rmul__(self, scalar):
+            return self.mul(scalar)
+
+        def reencrypt(self, zero=None, randomness=None):
+            # zero为所有分块共用的E(0, alpha_prime)
+            # 未指定时每个分块使用独立的随机数，randomness为返回(alpha, E(0, alpha))的可调用对象
+            pk = self.pk
+            p = pk.p
+            if zero is not None:
+                zeros = [zero] * len(self)
+            elif randomness is not None:
+                zeros = [randomness()[1] for _ in self.cm]
+            else:
+                zeros = [ElGamal.EncryptZero(pk, ElGamal.genAlpha(pk)) for _ in self.cm]
+            return ElGamal.CiphertextVector._from_columns(
+                [v * z.cm % p for v, z in zip(self.cm, zeros)],
+                [v * z.cr % p for v, z in zip(self.cr, zeros)],
+                pk,
+            )
+
+        def decrypt(self, sk):
+            return ElGamal.Decrypt(sk, self)
+
     @classmethod
-    def KeyGen(cls, iNumBits=512, iConfidence=32):
-        # p is the prime
-        # g is the primitve root
-        # x is random in (0, p-1) inclusive
+    def KeyGen(
+        cls,
+        iNumBits=512,
+        iConfidence=32,
+        subgroup=False,
+        exp_bits=None,
+        group=None,
+        workers=None,
+    ):
+        # p is the safe prime
+        # g generates the subgroup of order q = (p-1)/2
+        # x is random in [1, (p-1)/2]
         # h = g ^ x mod p
-        p = find_prime(iNumBits, iConfidence)
-        g = find_primitive_root(p)
-        g = pow(g, 2, p)
-        x = random.randint(1, (p - 1) // 2)
-        h = pow(g, x, p)
+        # group：使用标准群（如"modp2048"、"ffdhe2048"）而非生成新的素数，此时忽略iNumBits
+        # workers：并行搜索安全素数的进程数，iConfidence为Miller-Rabin轮数
+        if group is not None:
+            p, g, _ = keygen.standard_group(group)
+            iNumBits = p.bit_length()
+        else:
+            p = keygen.find_safe_prime(iNumBits, iConfidence, workers)
+            # 4 = 2^2 是二次剩余，落在阶为q=(p-1)/2的子群中
+            g = 4
+        if exp_bits is not None:
+            subgroup = True
+        q = (p - 1) // 2 if subgroup else None
+        if exp_bits is not None:
+            x = getrandbits(exp_bits) | 1
+        else:
+            x = randrange(1, (p - 1) // 2 + 1)
+        h = powmod(g, x, p)
         return (
-            ElGamal.PublicKey(p, g, h, iNumBits),
-            ElGamal.PrivateKey(p, g, x, iNumBits),
+            ElGamal.PublicKey(p, g, h, iNumBits, q, exp_bits),
+            ElGamal.PrivateKey(p, g, x, iNumBits, q),
         )
 
     @classmethod
-    def Encrypt(cls, pk, m, alpha=None):
+    def Encrypt(cls, pk, m, alpha=None, randomness=None):
+        # randomness：返回(alpha, E(0, alpha))的可调用对象（如预计算池），未指定alpha时使用
+        if alpha is not None:
+            zero = cls.EncryptZero(pk, alpha)
+            take = lambda: zero
+        elif randomness is not None:
+            take = lambda: randomness()[1]
+        else:
+            take = lambda: cls.EncryptZero(pk, cls.genAlpha(pk))
+
         if type(m) == int:
-            if alpha is None:
-                alpha = cls.genAlpha(pk.p)
-            cm = m * pow(pk.h, alpha, pk.p) % pk.p
-            cr = pow(pk.g, alpha, pk.p)
-            return ElGamal.Ciphertext(cm, cr, pk)
+            zero = take()
+            return ElGamal.Ciphertext(m * zero.cm % pk.p, zero.cr, pk)
         else:
-            z = encode(m, pk.iNumBits)
-            ret = []
+            z = codec.encode(m, pk.iNumBits)
+            cm, cr = [], []
             for i in z:
-                if alpha is None:
-                    alpha = cls.genAlpha(pk.p)
-                cm = i * pow(pk.h, alpha, pk.p) % pk.p
-                cr = pow(pk.g, alpha, pk.p)
-                ret.append(ElGamal.Ciphertext(cm, cr, pk))
-            return ret
+                # 未指定alpha时每个分块使用独立的随机数
+                zero = take()
+                cm.append(i * zero.cm % pk.p)
+                cr.append(zero.cr)
+            return ElGamal.CiphertextVector._from_columns(cm, cr, pk)
+
+    @classmethod
+    def EncryptExp(cls, pk, m, alpha=None, randomness=None):
+        # 指数ElGamal：E(m) = (g^m * h^alpha, g^alpha)，密文相加即明文相加
+        if alpha is not None:
+            zero = cls.EncryptZero(pk, alpha)
+        elif randomness is not None:
+            zero = randomness()[1]
+        else:
+            zero = cls.EncryptZero(pk, cls.genAlpha(pk))
+        return ElGamal.Ciphertext(pk.pow_g(m % pk.order) * zero.cm % pk.p, zero.cr, pk)
+
+    @classmethod
+    def DecryptExp(cls, sk, ciphertext, bound):
+        # 先解密得到g^m，再在[0, bound)内求离散对数
+        gm = cls.DecryptBlocks(sk, [ciphertext])[0]
+        return discrete_log_table(sk.g, sk.p, bound).log(gm, bound)
+
+    @classmethod
+    def EncryptZero(cls, pk, alpha):
+        # E(0, alpha) = (h^alpha, g^alpha)，即同态意义下零元（群单位元）的加密
+        return ElGamal.Ciphertext(pk.pow_h(alpha), pk.pow_g(alpha), pk)
+
+    @classmethod
+    def DecryptBlocks(cls, sk, ciphertexts) -> list:
+        # 批量计算各分块的明文整数 m = cm * cr^-x mod p
+        p = sk.p
+        if not isinstance(ciphertexts, ElGamal.CiphertextVector):
+            ciphertexts = list(ciphertexts)
+            ciphertexts = ElGamal.CiphertextVector._from_columns(
+                [c.cm for c in ciphertexts], [c.cr for c in ciphertexts], None
+            )
+        order = p - 1 if sk.q is None else sk.q
+        if 2 * sk.x.bit_length() < order.bit_length():
+            # 短私钥：cr^x代价很低，所有分块共享一次Montgomery批量求逆
+            s_inv = batch_invert([powmod(cr, sk.x, p) for cr in ciphertexts.cr], p)
+            return [int(cm * s % p) for cm, s in zip(ciphertexts.cm, s_inv)]
+        # 否则直接计算cr^(order-x) = cr^-x，无需求逆
+        e = order - sk.x
+        return [
+            int(cm * powmod(cr, e, p) % p)
+            for cm, cr in zip(ciphertexts.cm, ciphertexts.cr)
+        ]
 
     @classmethod
     def Decrypt(cls, sk, ciphertexts):
         if type(ciphertexts) == ElGamal.Ciphertext:
-            # s = cr^x mod p
-            s = pow(ciphertexts.cr, sk.x, sk.p)
-            # plaintext integer = cm*s^-1 mod p
-            plain_int = (ciphertexts.cm * pow(s, sk.p - 2, sk.p)) % sk.p
-            return plain_int
+            return cls.DecryptBlocks(sk, [ciphertexts])[0]
         else:
-            z = []
-            for c in ciphertexts:
-                # s = cr^x mod p
-                s = pow(c.cr, sk.x, sk.p)
-                # plaintext integer = cm*s^-1 mod p
-                z.append((c.cm * pow(s, sk.p - 2, sk.p)) % sk.p) 
-            decrypted = decode(z, sk.iNumBits)
-            # 删除末尾的\x00
-            return decrypted.rstrip(b"\x00")
+            z = cls.DecryptBlocks(sk, ciphertexts)
+            return codec.decode(z, sk.iNumBits)
 
     @classmethod
-    def ReEncrypt(cls, pk, ciphertext, alpha_prime=None):
-        # 生成一个新的随机数alpha_prime用于重加密
-        if alpha_prime is None:
-            alpha_prime = cls.genAlpha(pk.p)
+    def DecryptBatch(cls, sk, ciphertexts_list) -> list:
+        # 同时解密多组密文（如多个子任务的回答），所有分块一起处理
+        # 各组分别解码，无法解码的一组（如被篡改的回答）对应None，不影响其它组
+        ciphertexts_list = [
+            ElGamal.CiphertextVector.of(ciphertexts) for ciphertexts in ciphertexts_list
+        ]
+        blocks = ElGamal.CiphertextVector._from_columns(
+            [v for ciphertexts in ciphertexts_list for v in ciphertexts.cm],
+            [v for ciphertexts in ciphertexts_list for v in ciphertexts.cr],
+            None,
+        )
+        z = cls.DecryptBlocks(sk, blocks)
+        ret = []
+        offset = 0
+        for ciphertexts in ciphertexts_list:
+            ret.append(
+                codec.decode_or_none(z[offset : offset + len(ciphertexts)], sk.iNumBits)
+            )
+            offset += len(ciphertexts)
+        return ret
 
-        # 计算重加密的两个部分
-        cm_re = (
-            pow(pk.g, 0, pk.p) * pow(pk.h, alpha_prime, pk.p) % pk.p
-        )  # E(0, alpha_prime)的第一部分
-        cr_re = pow(pk.g, alpha_prime, pk.p)  # E(0, alpha_prime)的第二部分
+    @classmethod
+    def ReEncrypt(cls, pk, ciphertext, alpha_prime=None, zero=None):
+        # 生成一个新的随机数alpha_prime用于重加密
+        if zero is None:
+            if alpha_prime is None:
+                alpha_prime = cls.genAlpha(pk)
+            # E(0, alpha_prime)，对同一alpha_prime可由调用方预先计算后传入
+            zero = cls.EncryptZero(pk, alpha_prime)
 
         # 同态相乘原密文和新密文
-        new_cm = (ciphertext.cm * cm_re) % pk.p
-        new_cr = (ciphertext.cr * cr_re) % pk.p
+        new_cm = (ciphertext.cm * zero.cm) % pk.p
+        new_cr = (ciphertext.cr * zero.cr) % pk.p
 
         # 返回新的重加密后的密文
         return ElGamal.Ciphertext(new_cm, new_cr, pk)
 
     @classmethod
-    def genAlpha(cls, p):
-        return randrange(p - 1)
+    def VerifyReEncrypt(cls, pk, new_ciphertexts, ciphertexts, e_prime, c, beta) -> bool:
+        # 逐分块验证 E(0, beta) == (new / old)^c * e'
+        # 所有分块共用beta，E(0, beta)只计算一次；old的逆元统一批量计算
+        if len(new_ciphertexts) != len(ciphertexts):
+            return False
+        # 否则挑战c为偶数时，乘以-1的分块也能通过验证（非交互模式下证明者可反复尝试得到偶数c）
+        if not cls.__in_subgroup(pk, new_ciphertexts, ciphertexts, e_prime):
+            return False
+        p = pk.p
+        zero = cls.EncryptZero(pk, beta)
+        # 向量减法内部即为一次批量求逆
+        diff = cls.CiphertextVector.of(new_ciphertexts, pk) - cls.CiphertextVector.of(
+            ciphertexts, pk
+        )
+        for d_cm, d_cr in zip(diff.cm, diff.cr):
+            e1 = powmod(d_cm, c, p) * e_prime.cm % p
+            e2 = powmod(d_cr, c, p) * e_prime.cr % p
+            if zero.cm != e1 or zero.cr != e2:
+                return False
+        return True
+
+    @staticmethod
+    def __in_subgroup(pk, new_ciphertexts, ciphertexts, e_prime, symbols=None):
+        # 各分块重加密前后之比new/old的两个分量及e'都须在子群中
+        # Legendre符号可乘，new/old在子群中当且仅当new与old的Legendre符号相同，无需求逆
+        # symbols：以密文向量对象为索引缓存其各分量的Legendre符号，
+        # 批量验证一条重加密链时，上一跳的new即下一跳的old，每个向量只计算一次
+        if not (pk.in_subgroup(e_prime.cm) and pk.in_subgroup(e_prime.cr)):
+            return False
+        if symbols is None:
+            symbols = {}
+        pair = []
+        for vector in (new_ciphertexts, ciphertexts):
+            key = id(vector)
+            if key not in symbols:
+                v = ElGamal.CiphertextVector.of(vector, pk)
+                symbols[key] = [legendre(x, pk.p) for x in v.cm + v.cr]
+            pair.append(symbols[key])
+        # 符号为0即分量为p的倍数，不在群中
+        return pair[0] == pair[1] and 0 not in pair[0]
+
+    @classmethod
+    def VerifyReEncryptBatch(cls, pk, proofs) -> bool:
+        # 用随机线性组合把多份重加密证明的全部分块折叠为一次验证
+        # proofs: [(new_ciphertexts, ciphertexts, e_prime, c, beta), ...]
+        # 每个分块的验证等式 E(0, beta) == (new / old)^c * e' 取随机权重w后相乘：
+        #   prod_j (N_j / O_j)^c_j * e'_j^W_j == E(0, sum_j beta_j * W_j)
+        # 其中 N_j = prod_i new_ij^w_ij，O_j = prod_i old_ij^w_ij，W_j = sum_i w_ij
+        p = pk.p
+        symbols = {}
+        if not all(cls.__in_subgroup(pk, *proof[:3], symbols) for proof in proofs):
+            return False
+        numerators = []  # 每份证明的(N_j.cm, N_j.cr)
+        denominators = []  # 每份证明的O_j.cm, O_j.cr（统一批量求逆）
+        weight_sums = []
+        for new_ciphertexts, ciphertexts, e_prime, c, beta in proofs:
+            if len(new_ciphertexts) != len(ciphertexts):
+                return False
+            new_ciphertexts = cls.CiphertextVector.of(new_ciphertexts, pk)
+            ciphertexts = cls.CiphertextVector.of(ciphertexts, pk)
+            weights = [getrandbits(BATCH_WEIGHT_BITS) for _ in ciphertexts.cm]
+            numerators.append(
+                (
+                    multi_exp(new_ciphertexts.cm, weights, p),
+                    multi_exp(new_ciphertexts.cr, weights, p),
+                )
+            )
+            denominators.append(multi_exp(ciphertexts.cm, weights, p))
+            denominators.append(multi_exp(ciphertexts.cr, weights, p))
+            weight_sums.append(sum(weights))
+        inverses = batch_invert(denominators, p)
+
+        # 左侧所有的幂一起做一次多幂运算
+        bases_cm, bases_cr, exps = [], [], []
+        total_beta = 0
+        for j, (_, _, e_prime, c, beta) in enumerate(proofs):
+            n_cm, n_cr = numerators[j]
+            bases_cm += [n_cm * inverses[2 * j] % p, e_prime.cm]
+            bases_cr += [n_cr * inverses[2 * j + 1] % p, e_prime.cr]
+            exps += [c, weight_sums[j]]
+            total_beta += beta * weight_sums[j]
+        rhs = cls.EncryptZero(pk, total_beta % pk.order)
+        return (
+            multi_exp(bases_cm, exps, p) == rhs.cm
+            and multi_exp(bases_cr, exps, p) == rhs.cr
+        )
+
+    @classmethod
+    def genAlpha(cls, pk):
+        # 加密/重加密使用的随机数
+        if pk.exp_bits is not None:
+            return getrandbits(pk.exp_bits)
+        return randrange(int(pk.order))
+
+    @classmethod
+    def genNonce(cls, pk):
+        # 零知识证明中证明者的随机数alpha'
+        # 短指数模式下响应不做模约减，需比c*alpha多出PROOF_STAT_BITS比特以隐藏alpha
+        if pk.exp_bits is not None:
+            return getrandbits(2 * pk.exp_bits + PROOF_STAT_BITS)
+        return randrange(int(pk.order))
+
+    @classmethod
+    def genChallenge(cls, pk):
+        # 零知识证明中验证者的挑战c
+        if pk.exp_bits is not None:
+            return getrandbits(pk.exp_bits)
+        return randrange(int(pk.order))
+
+    @classmethod
+    def proofResponse(cls, pk, c, alpha, alpha_tmp):
+        # beta = c * alpha + alpha'，短指数模式下在整数上计算以保持beta较短
+        beta = c * alpha + alpha_tmp
+        if pk.exp_bits is None:
+            beta %= pk.order
+        return int(beta)
+
+    @classmethod
+    def challengeNI(cls, pk, new_ciphertexts, ciphertexts, e_prime):
+        # Fiat-Shamir：对证明的完整陈述（公钥、重加密前后密文、e'）做哈希得到挑战c
+        width = (pk.p.bit_length() + 7) // 8
+        h = hashlib.sha256(b"RFCrowdsourcing/ReEncryptNI/v1")
+        for v in (pk.p, pk.g, pk.h, len(ciphertexts), len(new_ciphertexts)):
+            h.update(int(v).to_bytes(width, "big"))
+        for v in (ciphertexts, new_ciphertexts, [e_prime]):
+            v = cls.CiphertextVector.of(v, pk)
+            for cm, cr in zip(v.cm, v.cr):
+                h.update(int(cm).to_bytes(width, "big"))
+                h.update(int(cr).to_bytes(width, "big"))
+        c = int.from_bytes(h.digest(), "big")
+        # 短指数模式下挑战长度与随机数一致
+        if pk.exp_bits is not None and pk.exp_bits < 256:
+            c >>= 256 - pk.exp_bits
+        return c
@@ -7,141 +7,440 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 # 基于顶层包的import
-from utils.elgamal import ElGamal
+from utils.elgamal import ElGamal, FIXED_BASE_CACHE_DIR, set_fixed_base_cache_dir
+from utils.ec_elgamal import ECElGamal, CURVES
+from utils.randomness_pool import RandomnessPool
+from utils import codec
+from utils.metrics import Metrics
 
 # 系统库
+import json
 import pickle
 from Crypto.Random.random import randrange
-from multiprocessing import Lock
+from concurrent.futures import ProcessPoolExecutor
 import time
 
+# 多进程模式下，分块数少于该值的消息仍在当前进程中处理
+PARALLEL_THRESHOLD = 16
+
+# 工作进程中的公私钥，由_init_worker在每个工作进程启动时初始化一次
+_worker_keys = {}
+
+
+def _init_worker(public_key_str, private_key_str, table_cache_dir):
+    set_fixed_base_cache_dir(table_cache_dir)
+    pk = ElGamal.PublicKey.from_str(public_key_str)
+    _worker_keys["pk"] = pk
+    _worker_keys["sk"] = (
+        None if private_key_str is None else ElGamal.PrivateKey.from_str(private_key_str)
+    )
+    # 预先构建（或从磁盘缓存映射）g、h的固定底数表
+    pk.pow_g(1)
+    pk.pow_h(1)
+
+
+def _encrypt_shard(blocks):
+    # 每个分块使用独立的随机数
+    pk = _worker_keys["pk"]
+    cm, cr = [], []
+    for m in blocks:
+        zero = ElGamal.EncryptZero(pk, ElGamal.genAlpha(pk))
+        cm.append(int(m * zero.cm % pk.p))
+        cr.append(int(zero.cr))
+    return cm, cr
+
+
+def _num_blocks(ciphertexts):
+    return (
+        1
+        if type(ciphertexts) in (ElGamal.Ciphertext, ECElGamal.Ciphertext)
+        else len(ciphertexts)
+    )
+
+
+def _decrypt_shard(cm, cr):
+    sk = _worker_keys["sk"]
+    return ElGamal.DecryptBlocks(sk, ElGamal.CiphertextVector(cm, cr, None))
+
+
+# 按密钥字符串选择方案：带曲线名（"group"字段）的密钥使用椭圆曲线ElGamal，其余为MODP群ElGamal
+def select_scheme(key_str):
+    return ECElGamal if json.loads(key_str).get("group") in CURVES else ElGamal
+
 
 class ElgamalEncryptor:
     # 构造函数 输入公私钥文件
     def __init__(self, public_key_str, private_key_str=None):
-        self.pk = ElGamal.PublicKey.from_str(public_key_str)
-        self.totaltime = 0
-        self.totaltimeLock = Lock()
+        # 加密方案（ElGamal或ECElGamal），两者接口一致
+        self.scheme = select_scheme(public_key_str)
+        self.pk = self.scheme.PublicKey.from_str(public_key_str)
+        # 各操作的次数、分块数和耗时统计
+        self.metrics = Metrics()
+        self.sk = None
         if private_key_str != None:
-            self.sk = ElGamal.PrivateKey.from_str(private_key_str)
-
-    # 生成密钥对
+            self.sk = self.scheme.PrivateKey.from_str(private_key_str)
+        # 固定底数预计算表的磁盘缓存目录
+        self.table_cache_dir = FIXED_BASE_CACHE_DIR
+        # 多进程加解密（默认不启用）
+        self.executor = None
+        self.executor_workers = 1
+        self.parallel_threshold = PARALLEL_THRESHOLD
+        # 随机数预计算池（默认容量为0，即全部同步计算）
+        self.alpha_pool = RandomnessPool(self.pk, 0, self.scheme.genAlpha)
+        self.nonce_pool = RandomnessPool(self.pk, 0, self.scheme.genNonce)
+
+    # 设置固定底数预计算表的磁盘缓存目录（None表示不使用），并预先准备g、h的表，返回耗时（秒）
+    # 同一主机上使用相同公钥的进程共享缓存文件：首个进程计算并写入，其余进程只读映射
+    def precomputeTables(self, cache_dir=FIXED_BASE_CACHE_DIR):
+        st = time.time()
+        set_fixed_base_cache_dir(cache_dir)
+        self.table_cache_dir = cache_dir
+        self.pk.pow_g(1)
+        self.pk.pow_h(1)
+        return time.time() - st
+
+    # 启动后台预计算池，分别用于加密/重加密和零知识证明
+    def startPool(self, capacity, nonce_capacity=None):
+        if nonce_capacity is None:
+            nonce_capacity = max(1, capacity // 8)
+        self.alpha_pool = RandomnessPool(self.pk, capacity, self.scheme.genAlpha)
+        # 非短指数模式下两者分布相同，共用一个池
+        if self.pk.exp_bits is None:
+            self.nonce_pool = self.alpha_pool
+        else:
+            self.nonce_pool = RandomnessPool(
+                self.pk, nonce_capacity, self.scheme.genNonce
+            )
+        self.alpha_pool.start()
+        self.nonce_pool.start()
+
+    # 启动多进程模式：分块数不少于threshold的消息在workers个进程间分片加解密
+    # 每个工作进程只在启动时解析一次密钥并构建预计算表
+    # 椭圆曲线方案的单次点运算开销远小于进程间传输，不启用多进程
+    def startExecutor(self, workers=None, threshold=PARALLEL_THRESHOLD):
+        if self.scheme is not ElGamal:
+            return
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.stopExecutor()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(
+                str(self.pk),
+                None if self.sk is None else str(self.sk),
+                self.table_cache_dir,
+            ),
+        )
+        self.executor_workers = workers
+        self.parallel_threshold = threshold
+
+    def stopExecutor(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+            self.executor_workers = 1
+
+    def __useExecutor(self, n):
+        return self.executor is not None and n >= self.parallel_threshold
+
+    # 将n个分块均匀切分为各工作进程的区间
+    def __shards(self, n):
+        k = min(self.executor_workers, n)
+        bounds = [n * i // k for i in range(k + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def __encryptParallel(self, msg):
+        blocks = codec.encode(msg, self.pk.iNumBits)
+        futures = [
+            self.executor.submit(_encrypt_shard, blocks[a:b])
+            for a, b in self.__shards(len(blocks))
+        ]
+        cm, cr = [], []
+        for future in futures:
+            shard_cm, shard_cr = future.result()
+            cm += shard_cm
+            cr += shard_cr
+        return ElGamal.CiphertextVector(cm, cr, self.pk)
+
+    def __decryptBlocksParallel(self, ciphertexts):
+        # 返回各分块的明文整数
+        ciphertexts = ElGamal.CiphertextVector.of(ciphertexts, self.pk)
+        futures = [
+            self.executor.submit(
+                _decrypt_shard,
+                [int(v) for v in ciphertexts.cm[a:b]],
+                [int(v) for v in ciphertexts.cr[a:b]],
+            )
+            for a, b in self.__shards(len(ciphertexts))
+        ]
+        z = []
+        for future in futures:
+            z += future.result()
+        return z
+
+    # 所有密码学操作的总耗时（秒），兼容原有的统计方式
+    @property
+    def totaltime(self):
+        return self.metrics.total_seconds()
+
+    # 各操作的统计结果
+    def metricsSnapshot(self):
+        return self.metrics.snapshot()
+
+    # 预计算池的命中/未命中计数
+    def poolStats(self):
+        return {"alpha": self.alpha_pool.stats(), "nonce": self.nonce_pool.stats()}
+
+    # 获取一组(alpha, E(0, alpha))
+    def takeRandomness(self):
+        return self.alpha_pool.take()
+
+    # 生成密钥对并保存，返回各阶段耗时（秒）
+    # group指定标准群（如"modp2048"）时跳过素数生成，workers为并行搜索素数的进程数
+    # group为曲线名（如"P-256"）时生成椭圆曲线ElGamal密钥，其余参数忽略
     @classmethod
     def generateAndSaveKeys(
-        cls, public_key_file, private_key_file, iNumBits=256, iConfidence=32
+        cls,
+        public_key_file,
+        private_key_file,
+        iNumBits=256,
+        iConfidence=32,
+        subgroup=False,
+        exp_bits=None,
+        group=None,
+        workers=None,
     ):
-        pk, sk = ElGamal.KeyGen(iNumBits, iConfidence)
+        st = time.time()
+        if group in CURVES:
+            pk, sk = ECElGamal.KeyGen(group)
+        else:
+            pk, sk = ElGamal.KeyGen(
+                iNumBits, iConfidence, subgroup, exp_bits, group, workers
+            )
+        t1 = time.time()
         with open(public_key_file, "wb") as f:
             pickle.dump(str(pk), f)
         with open(private_key_file, "wb") as f:
             pickle.dump(str(sk), f)
-
-    @classmethod
-    def createCiphertext(cls, s):
-        return ElGamal.Ciphertext.from_str(s)
+        t2 = time.time()
+        return {"keygen": t1 - st, "save": t2 - t1, "total": t2 - st}
+
+    # s为str(c)的JSON字符串，或packCiphertext返回的(cm, cr)编码
+    def createCiphertext(self, s):
+        if isinstance(s, (tuple, list)):
+            cm, cr = s
+            return self.scheme.Ciphertext(
+                self.pk.decode_element(cm), self.pk.decode_element(cr, True), self.pk
+            )
+        return self.scheme.Ciphertext.from_str(s)
+
+    # 单个密文的紧凑编码：只含两个群元素，不含公钥（接收方使用相同的公钥）
+    def packCiphertext(self, c):
+        return (self.pk.encode_element(c.cm), self.pk.encode_element(c.cr))
 
     # 用公钥加密
     def encrypt(self, msg, alpha=None):
         if self.pk is None:
             return False
-        st = time.time()
-        ret = ElGamal.Encrypt(self.pk, msg, alpha)
-        end = time.time()
-        with self.totaltimeLock:
-            self.totaltime += end - st
+        st = time.perf_counter_ns()
+        if (
+            alpha is None
+            and type(msg) != int
+            and self.__useExecutor(
+                -(-(codec.HEADER.size + len(msg)) // codec.block_size(self.pk.iNumBits))
+            )
+        ):
+            # 分块较多时在工作进程间分片加密（各进程自行生成随机数）
+            ret = self.__encryptParallel(msg)
+        else:
+            ret = self.scheme.Encrypt(self.pk, msg, alpha, self.alpha_pool.take)
+        self.metrics.record("encrypt", time.perf_counter_ns() - st, _num_blocks(ret))
+        return ret
+
+    # 指数ElGamal加密整数m，返回只含一个分块的密文向量，可与其它回答同态相加
+    def encryptExp(self, m):
+        if self.pk is None:
+            return False
+        st = time.perf_counter_ns()
+        ret = self.scheme.CiphertextVector.of(
+            [self.scheme.EncryptExp(self.pk, m, randomness=self.alpha_pool.take)],
+            self.pk,
+        )
+        self.metrics.record("encrypt", time.perf_counter_ns() - st, 1)
+        return ret
+
+    # 解密指数ElGamal密文，明文须在[0, bound)内
+    def decryptExp(self, ciphertext, bound):
+        if self.sk is None:
+            return False
+        st = time.perf_counter_ns()
+        if type(ciphertext) != self.scheme.Ciphertext:
+            ciphertext = ciphertext[0]
+        ret = self.scheme.DecryptExp(self.sk, ciphertext, bound)
+        self.metrics.record("decrypt", time.perf_counter_ns() - st, 1)
         return ret
 
     # 用私钥解密
     def decrypt(self, ciphertexts):
         if self.sk is None:
             return False
-        st = time.time()
-        ret = ElGamal.Decrypt(self.sk, ciphertexts)
-        end = time.time()
-        with self.totaltimeLock:
-            self.totaltime += end - st
+        st = time.perf_counter_ns()
+        if type(ciphertexts) != self.scheme.Ciphertext and self.__useExecutor(
+            len(ciphertexts)
+        ):
+            z = self.__decryptBlocksParallel(ciphertexts)
+            ret = codec.decode(z, self.sk.iNumBits)
+        else:
+            ret = self.scheme.Decrypt(self.sk, ciphertexts)
+        self.metrics.record(
+            "decrypt",
+            time.perf_counter_ns() - st,
+            _num_blocks(ciphertexts),
+        )
+        return ret
+
+    # 用私钥批量解密多组密文，返回各组的明文
+    def decryptBatch(self, ciphertexts_list):
+        if self.sk is None:
+            return False
+        st = time.perf_counter_ns()
+        if self.__useExecutor(sum(len(c) for c in ciphertexts_list)):
+            # 所有组的分块合并后统一分片
+            vectors = [ElGamal.CiphertextVector.of(c, self.pk) for c in ciphertexts_list]
+            z = self.__decryptBlocksParallel(
+                ElGamal.CiphertextVector(
+                    [v for c in vectors for v in c.cm],
+                    [v for c in vectors for v in c.cr],
+                    self.pk,
+                )
+            )
+            ret = []
+            offset = 0
+            for c in vectors:
+                ret.append(
+                    codec.decode_or_none(z[offset : offset + len(c)], self.sk.iNumBits)
+                )
+                offset += len(c)
+        else:
+            ret = self.scheme.DecryptBatch(self.sk, ciphertexts_list)
+        self.metrics.record(
+            "decrypt",
+            time.perf_counter_ns() - st,
+            sum(len(c) for c in ciphertexts_list),
+        )
         return ret
 
     # 用公钥重加密
-    def reEncrypt(self, ciphertexts, alpha_prime=None):
+    # zero为预先计算的E(0, alpha_prime)（如来自takeRandomness），未指定alpha_prime时每个分块从池中取随机数
+    def reEncrypt(self, ciphertexts, alpha_prime=None, zero=None):
         if self.pk is None:
             return False
-        # 对每个密文对象运行重加密
-        st = time.time()
-        if type(ciphertexts) == list:
-            ret = []
-            for ciphertext in ciphertexts:
-                ret.append(ElGamal.ReEncrypt(self.pk, ciphertext, alpha_prime))
+        st = time.perf_counter_ns()
+        # 所有分块共用alpha_prime时，E(0, alpha_prime)只需计算一次
+        if zero is None and alpha_prime is not None:
+            zero = self.scheme.EncryptZero(self.pk, alpha_prime)
+        if type(ciphertexts) == self.scheme.Ciphertext:
+            z = zero if zero is not None else self.alpha_pool.take()[1]
+            ret = self.scheme.ReEncrypt(self.pk, ciphertexts, zero=z)
         else:
-            ret = ElGamal.ReEncrypt(self.pk, ciphertexts, alpha_prime)
-        end = time.time()
-        with self.totaltimeLock:
-            self.totaltime += end - st
+            # 对整个密文向量运行重加密
+            ret = self.scheme.CiphertextVector.of(ciphertexts, self.pk).reencrypt(
+                zero, self.alpha_pool.take
+            )
+        self.metrics.record("reencrypt", time.perf_counter_ns() - st, _num_blocks(ret))
         return ret
 
     def genAlpha(self):
-        return ElGamal.genAlpha(self.pk.p)
+        return self.scheme.genAlpha(self.pk)
 
     # 重加密证明通信内容 1/3
     def proveReEncrypt_1(self):
         # 1.证明者发送e'
-        st = time.time()
-        alpha_tmp = randrange(self.pk.p - 1)
-        e_prime = self.encrypt(0, alpha_tmp)  # e' = E(0, alpha')
-        end = time.time()
-        with self.totaltimeLock:
-            self.totaltime += end - st
+        st = time.perf_counter_ns()
+        alpha_tmp, e_prime = self.nonce_pool.take()  # e' = E(0, alpha')
+        self.metrics.record("prove", time.perf_counter_ns() - st)
         return e_prime, alpha_tmp
 
     # 重加密证明通信内容 2/3
     def proveReEncrypt_2(self):
         # 2.验证者发送一个挑战c
-        st = time.time()
-        c = randrange(self.pk.p - 1)
-        end = time.time()
-        with self.totaltimeLock:
-            self.totaltime += end - st
+        st = time.perf_counter_ns()
+        c = self.scheme.genChallenge(self.pk)
+        self.metrics.record("challenge", time.perf_counter_ns() - st)
         return c
 
     # 重加密证明通信内容 3/3
     def proveReEncrypt_3(self, c, alpha, alpha_tmp) -> int:
         # 3.证明者基于挑战c构造并发送beta
-        st = time.time()
-        beta = (c * alpha + alpha_tmp) % (self.pk.p - 1)  # 计算响应beta
-        end = time.time()
-        with self.totaltimeLock:
-            self.totaltime += end - st
+        st = time.perf_counter_ns()
+        beta = self.scheme.proofResponse(self.pk, c, alpha, alpha_tmp)  # 计算响应beta
+        self.metrics.record("prove", time.perf_counter_ns() - st)
         return beta
 
+    # 非交互式（Fiat-Shamir）重加密证明，返回(e'.cm, e'.cr, beta)，由wire_format序列化
+    def proveReEncryptNI(self, new_ciphertexts, ciphertexts, alpha):
+        st = time.perf_counter_ns()
+        alpha_tmp, e_prime = self.nonce_pool.take()
+        c = self.scheme.challengeNI(self.pk, new_ciphertexts, ciphertexts, e_prime)
+        beta = self.scheme.proofResponse(self.pk, c, alpha, alpha_tmp)
+        self.metrics.record(
+            "prove",
+            time.perf_counter_ns() - st,
+            _num_blocks(new_ciphertexts),
+        )
+        return e_prime.cm, e_prime.cr, beta
+
+    # 将非交互式证明展开为(new_ciphertexts, ciphertexts, e_prime, c, beta)，可直接用于批量验证
+    def expandReEncryptNI(self, new_ciphertexts, ciphertexts, proof):
+        e_prime = self.scheme.Ciphertext(proof[0], proof[1], self.pk)
+        if not (self.pk.in_subgroup(e_prime.cm) and self.pk.in_subgroup(e_prime.cr)):
+            # e'不在子群中（或为缺少证明时的占位值），不计算挑战，验证必然失败
+            return new_ciphertexts, ciphertexts, e_prime, 0, 0
+        c = self.scheme.challengeNI(self.pk, new_ciphertexts, ciphertexts, e_prime)
+        return new_ciphertexts, ciphertexts, e_prime, c, proof[2]
+
+    # 验证非交互式重加密证明
+    def verifyReEncryptNI(self, new_ciphertexts, ciphertexts, proof):
+        return self.verifyReEncrypt(
+            *self.expandReEncryptNI(new_ciphertexts, ciphertexts, proof)
+        )
+
     # 验证重加密交互式证明模拟器的模拟结果
     def verifyReEncrypt(self, new_ciphertexts, ciphertexts, e_prime, c, beta):
-        def verify(new_ciphertext, ciphertext):
-            # 模拟最终的验证过程
-            # 检查E(0, beta)是否等于c * e * e'
-            # 对于ElGamal密文，我们需要分别计算每个组件
-            st = time.time()
-            e = new_ciphertext - ciphertext
-            tmp = self.encrypt(0, beta)
-            # 计算c * e * e' 的第一部分 (对应于ElGamal密文的cm)
-            e1 = (pow(e.cm, c, self.pk.p) * e_prime.cm) % self.pk.p
-            # 计算c * e * e' 的第二部分 (对应于ElGamal密文的cr)
-            e2 = (pow(e.cr, c, self.pk.p) * e_prime.cr) % self.pk.p
-            end = time.time()
-            with self.totaltimeLock:
-                self.totaltime += end - st
-            # 现在，我们将 E(0, beta) 的两部分与上面计算的两部分进行比较
-            return tmp.cm == e1 and tmp.cr == e2
-
-        if type(ciphertexts) == list:
-            if len(new_ciphertexts) != len(ciphertexts):
-                return False
-            # 验证每个密文
-            for i in range(len(new_ciphertexts)):
-                if not verify(new_ciphertexts[i], ciphertexts[i]):
-                    return False
-            return True
+        # 检查E(0, beta)是否等于c * e * e'，其中e = new_ciphertext - ciphertext
+        st = time.perf_counter_ns()
+        if type(ciphertexts) == self.scheme.Ciphertext:
+            valid = self.scheme.VerifyReEncrypt(
+                self.pk, [new_ciphertexts], [ciphertexts], e_prime, c, beta
+            )
         else:
-            return verify(new_ciphertexts, ciphertexts)
+            valid = self.scheme.VerifyReEncrypt(
+                self.pk, new_ciphertexts, ciphertexts, e_prime, c, beta
+            )
+        self.metrics.record(
+            "verify",
+            time.perf_counter_ns() - st,
+            _num_blocks(ciphertexts),
+        )
+        return valid
+
+    # 批量验证多份重加密证明（可跨多跳、多个子任务），返回每份证明的验证结果
+    # proofs: [(new_ciphertexts, ciphertexts, e_prime, c, beta), ...]
+    def verifyReEncryptBatch(self, proofs):
+        if not proofs:
+            return []
+        st = time.perf_counter_ns()
+        valid = self.scheme.VerifyReEncryptBatch(self.pk, proofs)
+        self.metrics.record(
+            "verify_batch",
+            time.perf_counter_ns() - st,
+            sum(_num_blocks(p[1]) for p in proofs),
+        )
+        if valid:
+            return [True] * len(proofs)
+        # 批量验证失败时逐份验证，定位无效的证明
+        return [self.verifyReEncrypt(*proof) for proof in proofs]
 
 
 if __name__ == "__main__":
@@ -149,11 +448,17 @@ if __name__ == "__main__":
     from Crypto.Util.number import inverse as multiplicative_inverse
 
     # 首次运行前需要生成密钥对并保存
-    # st = time.time()
-    # ElgamalEncryptor.generateAndSaveKeys(
+    # print(ElgamalEncryptor.generateAndSaveKeys(
     #     "tmp/pk.pkl", "tmp/sk.pkl", 256, 32
-    # )
-    # print(time.time() - st)
+    # ))
+    # 或直接使用标准群：
+    # print(ElgamalEncryptor.generateAndSaveKeys(
+    #     "tmp/keypairs/pk2048.pkl", "tmp/keypairs/sk2048.pkl", group="modp2048"
+    # ))
+    # 或使用椭圆曲线ElGamal：
+    # print(ElgamalEncryptor.generateAndSaveKeys(
+    #     "tmp/keypairs/pkP256.pkl", "tmp/keypairs/skP256.pkl", group="P-256"
+    # ))
 
     # 使用保存的密钥对初始化ElgamalEncryptor实例
     pk_file = "tmp/keypairs/pk2048.pkl"
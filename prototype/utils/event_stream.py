@@ -0,0 +1,299 @@
+# 节点到客户端的事件流，替代每个事件新建一条TCP连接
+# 每个节点（EventEmitter）与客户端保持一条长连接，事件在产生时记录时间戳，
+# 由后台线程攒批发送（批满或等待flush_interval后），客户端确认后才从待发送队列中移除；
+# 客户端（EventDispatcher）在事件循环中接收所有节点的事件流，到达即计数，
+# 回调函数在单独的分发线程中按到达顺序执行，较慢的回调不会阻塞接收和计数
+#
+# 协议（长度前缀消息，见network.sendLine/recvLine）：
+#   节点先发送 {"event_stream": 节点名, "session": 会话ID}
+#   之后每批发送 (首个事件的序号, [(事件名, 时间戳, 数据), ...])，客户端回复已接收的最大序号
+# 连接断开后节点重连并重发未确认的事件，客户端按(节点名, 会话ID)记录的序号丢弃重复的事件
+
+# 基于顶层包的import
+from prototype.utils import log
+from prototype.utils.aio_server import AsyncServer, recv_line, send_line
+from prototype.utils.network import sendLine, recvLine
+
+# 系统库
+import asyncio
+import collections
+import itertools
+import queue
+import socket
+import threading
+import time
+import uuid
+
+# 攒批的最长等待时间（秒）
+FLUSH_INTERVAL = 0.05
+
+# 每批最多发送的事件数，积压达到该数目时立即发送
+BATCH_SIZE = 256
+
+# 客户端不可达时最多缓存的事件数，超出时丢弃最早的事件
+MAX_PENDING = 100000
+
+# 发送失败后重连的间隔（秒）
+RETRY_INTERVAL = 1
+
+# 客户端同时保持的事件流上限（每个节点一条，协程处理，不占用线程）
+MAX_STREAMS = 4096
+
+# 客户端收到的事件，timestamp为节点产生事件时节点所在主机的时间（time.time()），不宜与客户端的时钟相减
+Event = collections.namedtuple("Event", ["name", "source", "timestamp", "data"])
+
+
+class EventEmitter:
+    """节点端：产生事件并经长连接批量发送给客户端，emit不等待网络IO"""
+
+    def __init__(
+        self,
+        source,
+        client_ip,
+        client_port,
+        flush_interval=FLUSH_INTERVAL,
+        batch_size=BATCH_SIZE,
+    ):
+        self.source = source
+        self.client_ip = client_ip
+        self.client_port = client_port
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # 进程重启后序号从0开始，客户端按会话区分，不会被当作重复的事件
+        self.session = uuid.uuid4().hex
+        self.cond = threading.Condition()
+        self.pending = collections.deque()  # 未确认的(序号, 事件名, 时间戳, 数据)
+        self.next_seq = 0
+        self.dropped = 0
+        self.closed = False
+        self.sock = None
+        self.thread = None
+        self.failing = False  # 连接失败后只记录一次日志，直到重新发送成功
+
+    def emit(self, name, data=None):
+        with self.cond:
+            if self.closed:
+                raise RuntimeError(f"event emitter of {self.source} is closed")
+            self.pending.append((self.next_seq, name, time.time(), data))
+            self.next_seq += 1
+            if len(self.pending) > MAX_PENDING:
+                self.pending.popleft()
+                self.dropped += 1
+            # 唤醒发送线程：开始攒批，或已攒满一批
+            if len(self.pending) == 1 or len(self.pending) >= self.batch_size:
+                self.cond.notify_all()
+            # 首次产生事件时才连接客户端
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run, daemon=True)
+                self.thread.start()
+
+    def flush(self, timeout=None):
+        """等待已产生的事件全部被客户端确认，超时返回False"""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending, timeout)
+
+    def close(self, timeout=None):
+        """发送剩余的事件（最多等待timeout秒）后关闭连接"""
+        self.flush(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def __run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if self.closed and not self.pending:
+                    break
+                # 攒批：等到积压满一批，或从看到第一个事件起等待flush_interval
+                self.cond.wait_for(
+                    lambda: len(self.pending) >= self.batch_size or self.closed,
+                    self.flush_interval,
+                )
+                batch = list(itertools.islice(self.pending, self.batch_size))
+            try:
+                acked = self.__send(batch)
+            except (OSError, EOFError) as err:
+                if not self.failing:
+                    log.error(f"【{self.source}】event stream to client failed: {err!r}")
+                    self.failing = True
+                self.__disconnect()
+                with self.cond:
+                    if self.closed:
+                        break
+                time.sleep(RETRY_INTERVAL)
+                continue
+            self.failing = False
+            with self.cond:
+                while self.pending and self.pending[0][0] <= acked:
+                    self.pending.popleft()
+                self.cond.notify_all()
+        self.__disconnect()
+
+    def __send(self, batch):
+        if self.sock is None:
+            sock = socket.create_connection((self.client_ip, self.client_port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sendLine(sock, {"event_stream": self.source, "session": self.session})
+            self.sock = sock
+        sendLine(self.sock, (batch[0][0], [event[1:] for event in batch]))
+        acked = recvLine(self.sock)
+        if type(acked) is not int:
+            raise EOFError(f"unexpected acknowledgement: {acked!r}")
+        return acked
+
+    def __disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class EventDispatcher:
+    """客户端：接收所有节点的事件流，计数并分发给回调函数
+
+    on注册回调，wait_for等待某类事件达到指定数目（如所有Randomizer注册完成）
+    回调在分发线程中执行，可在回调中调用stop
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.server = AsyncServer(self.__serve, port, MAX_STREAMS)
+        self.handlers = collections.defaultdict(list)  # 事件名（None表示所有事件） -> 回调
+        self.counts = collections.Counter()
+        self.cond = threading.Condition()
+        self.events = queue.SimpleQueue()  # 待分发的事件，None表示停止
+        self.last_seq = {}  # (节点名, 会话ID) -> 已接收的最大序号
+        self.thread = None
+
+    def on(self, name, callback):
+        """注册回调callback(event)，name为None时接收所有事件；同一事件的回调按注册顺序执行"""
+        self.handlers[name].append(callback)
+
+    def start(self):
+        """在后台开始接收和分发，返回时已开始监听"""
+        self.thread = threading.Thread(target=self.__dispatch_loop, daemon=True)
+        self.thread.start()
+        self.server.start()
+        return self
+
+    def stop(self, timeout=0):
+        """停止接收（最多等待timeout秒）并在分发完已收到的事件后结束分发线程"""
+        self.server.shutdown(timeout)
+        self.events.put(None)
+
+    def count(self, name):
+        with self.cond:
+            return self.counts[name]
+
+    def wait_for(self, name, n, timeout=None):
+        """等待事件name累计收到n个，超时返回False"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.counts[name] >= n, timeout)
+
+    async def __serve(self, conn, addr):
+        try:
+            hello = await recv_line(conn)
+            if type(hello) is not dict or "event_stream" not in hello:
+                log.error(f"【Client】unexpected message on event port: {hello!r}")
+                return
+            source = hello["event_stream"]
+            key = (source, hello.get("session"))
+            while True:
+                first_seq, events = await recv_line(conn)
+                last = self.last_seq.get(key, -1)
+                fresh = [
+                    Event(name, source, timestamp, data)
+                    for seq, (name, timestamp, data) in enumerate(events, first_seq)
+                    if seq > last
+                ]
+                self.last_seq[key] = max(last, first_seq + len(events) - 1)
+                self.__receive(fresh)
+                await send_line(conn, self.last_seq[key])
+        except (EOFError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    def __receive(self, events):
+        # 在事件循环中计数，等待计数的线程立即被唤醒，不受回调执行快慢的影响
+        if not events:
+            return
+        with self.cond:
+            for event in events:
+                self.counts[event.name] += 1
+            self.cond.notify_all()
+        for event in events:
+            self.events.put(event)
+
+    def __dispatch_loop(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+            for callback in self.handlers[event.name] + self.handlers[None]:
+                try:
+                    callback(event)
+                except Exception as err:
+                    log.error(f"【Client】event callback error on {event.name}: {err!r}")
+
+
+if __name__ == "__main__":
+    # 对比每个事件新建一条连接（客户端串行处理）与事件流：nodes个节点同时各产生events个事件
+    from prototype.utils import network
+
+    nodes = 20
+    events = 200
+    PORT = 44460
+
+    received = []
+    lock = threading.Lock()
+
+    def old_server(conn, addr):
+        instruction = recvLine(conn)
+        with lock:
+            received.append(instruction)
+        conn.close()
+
+    def old_emit(name):
+        def handler(conn):
+            sendLine(conn, f"event/{name}")
+            conn.close()
+
+        network.connect_to(handler, PORT)
+
+    def burst(emit):
+        threads = [
+            threading.Thread(
+                target=lambda i=i: [emit(i, f"EVENT_{j}") for j in range(events)]
+            )
+            for i in range(nodes)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    threading.Thread(
+        target=network.listen_on_port, args=(old_server, PORT, False), daemon=True
+    ).start()
+    time.sleep(0.2)
+    st = time.perf_counter()
+    burst(lambda i, name: old_emit(name))
+    while len(received) < nodes * events:
+        time.sleep(0.001)
+    old_time = time.perf_counter() - st
+    print(f"connection per event: {nodes * events / old_time:.0f} events/s")
+
+    # 回调每次耗时1ms，计数（wait_for）仍随事件到达立即更新
+    dispatcher = EventDispatcher(PORT + 1)
+    dispatcher.on(None, lambda event: time.sleep(0.001))
+    dispatcher.start()
+    emitters = [EventEmitter(f"node-{i}", "localhost", PORT + 1) for i in range(nodes)]
+    st = time.perf_counter()
+    burst(lambda i, name: emitters[i].emit("EVENT"))
+    assert dispatcher.wait_for("EVENT", nodes * events, timeout=30)
+    new_time = time.perf_counter() - st
+    print(f"event stream:         {nodes * events / new_time:.0f} events/s")
+    for emitter in emitters:
+        emitter.close(timeout=5)
+    dispatcher.stop()
@@ -0,0 +1,164 @@
+# 长度前缀帧的收发
+# 接收时按长度一次性分配bytearray，通过recv_into直接写入（memoryview切片不复制），避免data += more的反复拷贝
+# 发送时帧头与负载通过一次sendmsg（scatter-gather）写出，不拼接也不分两次发送
+#
+# 帧格式：长度(!I) | 负载
+# 负载不小于ESCAPE（4 GiB - 1）字节时，长度字段写ESCAPE，其后再跟8字节的真实长度(!Q)
+# 小于4 GiB的帧与原格式完全相同，旧的收发端无需修改
+
+# 系统库
+import socket
+import struct
+
+HEADER = struct.Struct("!I")
+LONG_HEADER = struct.Struct("!Q")
+ESCAPE = 0xFFFFFFFF
+
+# 单次sendmsg最多携带的缓冲区个数（Linux的IOV_MAX）
+IOV_MAX = 1024
+
+# 不支持sendmsg的连接（如多路复用的流）上，负载不超过该字节数时与帧头拼接后一次发送
+COALESCE_LIMIT = 64 * 1024
+
+# 不超过该字节数的数据先尝试直接recv，通常一次即可收齐
+SMALL_FRAME = 64 * 1024
+
+
+class FrameTooLarge(ValueError):
+    """帧长度超过接收方允许的上限"""
+
+
+def header(length):
+    if length < ESCAPE:
+        return HEADER.pack(length)
+    return HEADER.pack(ESCAPE) + LONG_HEADER.pack(length)
+
+
+def recv_exact_into(sock, view):
+    """填满view（memoryview），对端提前关闭时抛出EOFError"""
+    length = len(view)
+    offset = 0
+    while offset < length:
+        n = sock.recv_into(view[offset:])
+        if not n:
+            raise EOFError(f"socket closed {offset} bytes into a {length}-byte message")
+        offset += n
+
+
+def recv_exact(sock, length):
+    """接收指定长度的数据，返回bytes或bytearray"""
+    if length <= SMALL_FRAME:
+        # 小数据通常一次recv即可收齐，省去预分配和memoryview的开销
+        data = sock.recv(length)
+        if len(data) == length:
+            return data
+        if not data:
+            raise EOFError(f"socket closed 0 bytes into a {length}-byte message")
+        buf = bytearray(length)
+        buf[: len(data)] = data
+        recv_exact_into(sock, memoryview(buf)[len(data) :])
+        return buf
+    buf = bytearray(length)
+    recv_exact_into(sock, memoryview(buf))
+    return buf
+
+
+def recv_length(sock):
+    (length,) = HEADER.unpack(recv_exact(sock, HEADER.size))
+    if length == ESCAPE:
+        (length,) = LONG_HEADER.unpack(recv_exact(sock, LONG_HEADER.size))
+    return length
+
+
+def recv_frame(sock, max_size=None):
+    """接收一帧，返回负载（bytearray）；max_size不为None时拒绝更长的帧（在分配内存之前）"""
+    length = recv_length(sock)
+    if max_size is not None and length > max_size:
+        raise FrameTooLarge(f"{length}-byte frame exceeds the {max_size}-byte limit")
+    return recv_exact(sock, length)
+
+
+def sendmsg_all(sock, buffers):
+    """将多个缓冲区依次完整写出；sendmsg可能只写出一部分（如超过单次写入上限），需从断点继续"""
+    total = sum(len(b) for b in buffers)
+    if not hasattr(sock, "sendmsg"):
+        if total <= COALESCE_LIMIT:
+            sock.sendall(b"".join(buffers))
+        else:
+            for buf in buffers:
+                sock.sendall(buf)
+        return
+    sent = sock.sendmsg(buffers)
+    if sent == total:
+        return
+    views = [memoryview(b).cast("B") for b in buffers if len(b)]
+    while True:
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if not views:
+            return
+        if sent:
+            views[0] = views[0][sent:]
+        sent = sock.sendmsg(views[:IOV_MAX])
+
+
+def send_frame(sock, payload):
+    sendmsg_all(sock, [header(len(payload)), payload])
+
+
+if __name__ == "__main__":
+    # 对比原实现（data += more接收、两次sendall发送）与本模块在1 KB–64 MB帧上的吞吐
+    import threading
+    import time
+
+    def old_recv_all(s, length):
+        data = b""
+        while len(data) < length:
+            more = s.recv(length - len(data))
+            if not more:
+                raise EOFError
+            data += more
+        return data
+
+    def old_recv_frame(s):
+        (length,) = HEADER.unpack(old_recv_all(s, HEADER.size))
+        return old_recv_all(s, length)
+
+    def old_send_frame(s, payload):
+        s.sendall(HEADER.pack(len(payload)))
+        s.sendall(payload)
+
+    implementations = [
+        ("recvAll/2x sendall", old_send_frame, old_recv_frame),
+        ("recv_into/sendmsg", send_frame, recv_frame),
+    ]
+
+    for size in [1 << 10, 64 << 10, 1 << 20, 16 << 20, 64 << 20]:
+        payload = b"\x5a" * size
+        # 每个尺寸传输约256 MB（至少3帧，小帧最多2万帧）
+        count = max(3, min(20000, (256 << 20) // size))
+        for name, send, recv in implementations:
+            a, b = socket.socketpair()
+            for s in (a, b):
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+
+            def sender():
+                for _ in range(count):
+                    send(a, payload)
+
+            t = threading.Thread(target=sender)
+            st = time.perf_counter()
+            t.start()
+            for _ in range(count):
+                assert len(recv(b)) == size
+            elapsed = time.perf_counter() - st
+            t.join()
+            a.close()
+            b.close()
+            throughput = count * size / elapsed / 2**20
+            print(
+                f"{size >> 10:>6} KB  {name:<19} {throughput:8.1f} MB/s"
+                f"  {elapsed / count * 1e6:10.1f} us/frame"
+            )
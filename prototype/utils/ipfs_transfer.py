@@ -0,0 +1,87 @@
+# 与IPFS交换字节串的两种方式：
+#   memory：上传用add_bytes（multipart请求体直接由内存中的字节串生成），
+#           下载用cat（逐块读取HTTP响应写入内存缓冲区），不经过磁盘
+#   file：原有方式，上传前写入临时文件再add，下载用get（tar流解包到下载目录）后读回，
+#         作为memory不可用时（如内存不足以容纳整个文件）的后备
+
+# 系统库
+import os
+import uuid
+
+# 上传时请求体每块的大小（ipfshttpclient默认为8 KiB，较大的密文文件会切成大量小块）
+CHUNK_SIZE = 1 << 20
+
+# file方式的临时文件目录和下载目录
+TMP_DIR = "tmp"
+DOWNLOAD_DIR = "tmp/IPFS_downloads"
+
+
+def add_bytes(client, data):
+    """上传字节串，返回文件的CID"""
+    return client.add_bytes(bytes(data))
+
+
+def cat(client, cid):
+    """下载文件内容，返回bytearray（不再整体复制一次）"""
+    buffer = bytearray()
+    for chunk in client.cat(cid, stream=True):
+        buffer += chunk
+    return buffer
+
+
+def add_file(client, data):
+    """经临时文件上传字节串，返回文件的CID"""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    tmp_file = f"{TMP_DIR}/{uuid.uuid1()}"
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+        return client.add(tmp_file)["Hash"]
+    finally:
+        # 删除临时文件
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def get_file(client, cid):
+    """经下载目录获取文件内容"""
+    client.get(cid, DOWNLOAD_DIR)
+    with open(f"{DOWNLOAD_DIR}/{cid}", "rb") as f:
+        return f.read()
+
+
+TRANSFERS = {
+    "memory": (add_bytes, cat),
+    "file": (add_file, get_file),
+}
+
+
+if __name__ == "__main__":
+    # 对比两种方式上传、下载不同大小文件的耗时，需要配置文件中的IPFS服务（app.ipfs_url）
+    import sys
+    import time
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    from prototype.thirdparty import ipfshttpclient
+    from prototype.utils.config import Config
+
+    client = ipfshttpclient.connect(
+        Config().get_config("app").get("ipfs_url"), chunk_size=CHUNK_SIZE
+    )
+    rounds = 5
+    for size in [4 << 10, 256 << 10, 4 << 20, 64 << 20]:
+        data = os.urandom(size)
+        for name, (submit, fetch) in TRANSFERS.items():
+            submit_time = fetch_time = 0
+            for _ in range(rounds):
+                st = time.perf_counter()
+                cid = submit(client, data)
+                submit_time += time.perf_counter() - st
+                st = time.perf_counter()
+                assert fetch(client, cid) == data
+                fetch_time += time.perf_counter() - st
+            print(
+                f"{size >> 10:>6} KiB {name:<6} "
+                f"add {submit_time / rounds * 1000:8.2f} ms  "
+                f"fetch {fetch_time / rounds * 1000:8.2f} ms"
+            )
@@ -0,0 +1,209 @@
+# 添加当前路径至解释器，确保单元测试时可正常import其它文件
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# 基于顶层包的import
+from utils.bigint import mpz, powmod
+
+# 系统库
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from Crypto.Random.random import getrandbits, randrange
+
+# 安全素数 p = 2q + 1 的生成：小素数筛 + Miller-Rabin，多进程并行搜索候选区间
+# 也可直接使用 RFC 3526 / RFC 7919 中的标准群（均为安全素数，2生成阶为q的子群）
+
+# 筛法使用的小素数上界
+SIEVE_LIMIT = 1 << 16
+
+# 每个搜索任务覆盖的候选数个数（以位长的倍数计）
+WINDOW_FACTOR = 16
+
+# RFC 3526（MODP）与 RFC 7919（FFDHE）标准群，生成元均为2
+STANDARD_GROUPS = {
+    "modp1536": """
+        FFFFFFFF FFFFFFFF C90FDAA2 2168C234 C4C6628B 80DC1CD1 29024E08 8A67CC74
+        020BBEA6 3B139B22 514A0879 8E3404DD EF9519B3 CD3A431B 302B0A6D F25F1437
+        4FE1356D 6D51C245 E485B576 625E7EC6 F44C42E9 A637ED6B 0BFF5CB6 F406B7ED
+        EE386BFB 5A899FA5 AE9F2411 7C4B1FE6 49286651 ECE45B3D C2007CB8 A163BF05
+        98DA4836 1C55D39A 69163FA8 FD24CF5F 83655D23 DCA3AD96 1C62F356 208552BB
+        9ED52907 7096966D 670C354E 4ABC9804 F1746C08 CA237327 FFFFFFFF FFFFFFFF""",
+    "modp2048": """
+        FFFFFFFF FFFFFFFF C90FDAA2 2168C234 C4C6628B 80DC1CD1 29024E08 8A67CC74
+        020BBEA6 3B139B22 514A0879 8E3404DD EF9519B3 CD3A431B 302B0A6D F25F1437
+        4FE1356D 6D51C245 E485B576 625E7EC6 F44C42E9 A637ED6B 0BFF5CB6 F406B7ED
+        EE386BFB 5A899FA5 AE9F2411 7C4B1FE6 49286651 ECE45B3D C2007CB8 A163BF05
+        98DA4836 1C55D39A 69163FA8 FD24CF5F 83655D23 DCA3AD96 1C62F356 208552BB
+        9ED52907 7096966D 670C354E 4ABC9804 F1746C08 CA18217C 32905E46 2E36CE3B
+        E39E772C 180E8603 9B2783A2 EC07A28F B5C55DF0 6F4C52C9 DE2BCBF6 95581718
+        3995497C EA956AE5 15D22618 98FA0510 15728E5A 8AACAA68 FFFFFFFF FFFFFFFF""",
+    "modp3072": """
+        FFFFFFFF FFFFFFFF C90FDAA2 2168C234 C4C6628B 80DC1CD1 29024E08 8A67CC74
+        020BBEA6 3B139B22 514A0879 8E3404DD EF9519B3 CD3A431B 302B0A6D F25F1437
+        4FE1356D 6D51C245 E485B576 625E7EC6 F44C42E9 A637ED6B 0BFF5CB6 F406B7ED
+        EE386BFB 5A899FA5 AE9F2411 7C4B1FE6 49286651 ECE45B3D C2007CB8 A163BF05
+        98DA4836 1C55D39A 69163FA8 FD24CF5F 83655D23 DCA3AD96 1C62F356 208552BB
+        9ED52907 7096966D 670C354E 4ABC9804 F1746C08 CA18217C 32905E46 2E36CE3B
+        E39E772C 180E8603 9B2783A2 EC07A28F B5C55DF0 6F4C52C9 DE2BCBF6 95581718
+        3995497C EA956AE5 15D22618 98FA0510 15728E5A 8AAAC42D AD33170D 04507A33
+        A85521AB DF1CBA64 ECFB8504 58DBEF0A 8AEA7157 5D060C7D B3970F85 A6E1E4C7
+        ABF5AE8C DB0933D7 1E8C94E0 4A25619D CEE3D226 1AD2EE6B F12FFA06 D98A0864
+        D8760273 3EC86A64 521F2B18 177B200C BBE11757 7A615D6C 770988C0 BAD946E2
+        08E24FA0 74E5AB31 43DB5BFC E0FD108E 4B82D120 A93AD2CA FFFFFFFF FFFFFFFF""",
+    "modp4096": """
+        FFFFFFFF FFFFFFFF C90FDAA2 2168C234 C4C6628B 80DC1CD1 29024E08 8A67CC74
+        020BBEA6 3B139B22 514A0879 8E3404DD EF9519B3 CD3A431B 302B0A6D F25F1437
+        4FE1356D 6D51C245 E485B576 625E7EC6 F44C42E9 A637ED6B 0BFF5CB6 F406B7ED
+        EE386BFB 5A899FA5 AE9F2411 7C4B1FE6 49286651 ECE45B3D C2007CB8 A163BF05
+        98DA4836 1C55D39A 69163FA8 FD24CF5F 83655D23 DCA3AD96 1C62F356 208552BB
+        9ED52907 7096966D 670C354E 4ABC9804 F1746C08 CA18217C 32905E46 2E36CE3B
+        E39E772C 180E8603 9B2783A2 EC07A28F B5C55DF0 6F4C52C9 DE2BCBF6 95581718
+        3995497C EA956AE5 15D22618 98FA0510 15728E5A 8AAAC42D AD33170D 04507A33
+        A85521AB DF1CBA64 ECFB8504 58DBEF0A 8AEA7157 5D060C7D B3970F85 A6E1E4C7
+        ABF5AE8C DB0933D7 1E8C94E0 4A25619D CEE3D226 1AD2EE6B F12FFA06 D98A0864
+        D8760273 3EC86A64 521F2B18 177B200C BBE11757 7A615D6C 770988C0 BAD946E2
+        08E24FA0 74E5AB31 43DB5BFC E0FD108E 4B82D120 A9210801 1A723C12 A787E6D7
+        88719A10 BDBA5B26 99C32718 6AF4E23C 1A946834 B6150BDA 2583E9CA 2AD44CE8
+        DBBBC2DB 04DE8EF9 2E8EFC14 1FBECAA6 287C5947 4E6BC05D 99B2964F A090C3A2
+        233BA186 515BE7ED 1F612970 CEE2D7AF B81BDD76 2170481C D0069127 D5B05AA9
+        93B4EA98 8D8FDDC1 86FFB7DC 90A6C08F 4DF435C9 34063199 FFFFFFFF FFFFFFFF""",
+    "ffdhe2048": """
+        FFFFFFFF FFFFFFFF ADF85458 A2BB4A9A AFDC5620 273D3CF1 D8B9C583 CE2D3695
+        A9E13641 146433FB CC939DCE 249B3EF9 7D2FE363 630C75D8 F681B202 AEC4617A
+        D3DF1ED5 D5FD6561 2433F51F 5F066ED0 85636555 3DED1AF3 B557135E 7F57C935
+        984F0C70 E0E68B77 E2A689DA F3EFE872 1DF158A1 36ADE735 30ACCA4F 483A797A
+        BC0AB182 B324FB61 D108A94B B2C8E3FB B96ADAB7 60D7F468 1D4F42A3 DE394DF4
+        AE56EDE7 6372BB19 0B07A7C8 EE0A6D70 9E02FCE1 CDF7E2EC C03404CD 28342F61
+        9172FE9C E98583FF 8E4F1232 EEF28183 C3FE3B1B 4C6FAD73 3BB5FCBC 2EC22005
+        C58EF183 7D1683B2 C6F34A26 C1B2EFFA 886B4238 61285C97 FFFFFFFF FFFFFFFF""",
+    "ffdhe3072": """
+        FFFFFFFF FFFFFFFF ADF85458 A2BB4A9A AFDC5620 273D3CF1 D8B9C583 CE2D3695
+        A9E13641 146433FB CC939DCE 249B3EF9 7D2FE363 630C75D8 F681B202 AEC4617A
+        D3DF1ED5 D5FD6561 2433F51F 5F066ED0 85636555 3DED1AF3 B557135E 7F57C935
+        984F0C70 E0E68B77 E2A689DA F3EFE872 1DF158A1 36ADE735 30ACCA4F 483A797A
+        BC0AB182 B324FB61 D108A94B B2C8E3FB B96ADAB7 60D7F468 1D4F42A3 DE394DF4
+        AE56EDE7 6372BB19 0B07A7C8 EE0A6D70 9E02FCE1 CDF7E2EC C03404CD 28342F61
+        9172FE9C E98583FF 8E4F1232 EEF28183 C3FE3B1B 4C6FAD73 3BB5FCBC 2EC22005
+        C58EF183 7D1683B2 C6F34A26 C1B2EFFA 886B4238 611FCFDC DE355B3B 6519035B
+        BC34F4DE F99C0238 61B46FC9 D6E6C907 7AD91D26 91F7F7EE 598CB0FA C186D91C
+        AEFE1309 85139270 B4130C93 BC437944 F4FD4452 E2D74DD3 64F2E21E 71F54BFF
+        5CAE82AB 9C9DF69E E86D2BC5 22363A0D ABC52197 9B0DEADA 1DBF9A42 D5C4484E
+        0ABCD06B FA53DDEF 3C1B20EE 3FD59D7C 25E41D2B 66C62E37 FFFFFFFF FFFFFFFF""",
+}
+
+
+def _small_primes(limit):
+    sieve = bytearray([1]) * limit
+    sieve[0:2] = b"\x00\x00"
+    for i in range(2, int(limit**0.5) + 1):
+        if sieve[i]:
+            sieve[i * i :: i] = bytes(len(range(i * i, limit, i)))
+    # 只保留奇素数，偶数由候选数的构造排除
+    return [i for i in range(3, limit) if sieve[i]]
+
+
+SMALL_PRIMES = _small_primes(SIEVE_LIMIT)
+
+
+def miller_rabin(n, rounds):
+    """Miller-Rabin素性测试，底数由CSPRNG选取"""
+    if n < 4:
+        return n in (2, 3)
+    if n % 2 == 0:
+        return False
+    n = mpz(n)
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for _ in range(rounds):
+        x = powmod(randrange(2, int(n) - 1), d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _search_window(bits, rounds):
+    """在随机起点q0之后的一段区间内寻找安全素数，找不到时返回None
+
+    候选为 q = q0 + 2k，同时筛掉q和p = 2q + 1 中含小素因子的k
+    """
+    window = WINDOW_FACTOR * bits
+    q0 = getrandbits(bits - 1) | (1 << (bits - 2)) | 1
+    composite = bytearray(window)
+    for r in SMALL_PRIMES:
+        inv2 = (r + 1) // 2  # 2在模r下的逆元
+        # q = q0 + 2k 被r整除，或 p = 2q + 1 被r整除（即q ≡ (r-1)/2 mod r）
+        for target in (0, (r - 1) // 2):
+            start = (target - q0) * inv2 % r
+            composite[start::r] = b"\x01" * len(range(start, window, r))
+    for k in range(window):
+        if composite[k]:
+            continue
+        q = mpz(q0 + 2 * k)
+        p = 2 * q + 1
+        # 先用底数2的费马测试快速排除，再对q、p做完整的Miller-Rabin测试
+        if powmod(2, p - 1, p) != 1:
+            continue
+        if miller_rabin(q, rounds) and miller_rabin(p, rounds):
+            return int(p)
+    return None
+
+
+def find_safe_prime(bits, rounds=32, workers=None):
+    """生成bits位的安全素数p，workers为并行进程数（默认CPU核数，1表示在当前进程中搜索）"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        while True:
+            p = _search_window(bits, rounds)
+            if p is not None:
+                return p
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {executor.submit(_search_window, bits, rounds) for _ in range(workers)}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                p = future.result()
+                if p is not None:
+                    return p
+                pending.add(executor.submit(_search_window, bits, rounds))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def standard_group(name):
+    """返回标准群的(p, g, q)"""
+    if name not in STANDARD_GROUPS:
+        raise ValueError(
+            f"unknown group {name!r}, expected one of {sorted(STANDARD_GROUPS)}"
+        )
+    p = int("".join(STANDARD_GROUPS[name].split()), 16)
+    return p, 2, (p - 1) // 2
+
+
+if __name__ == "__main__":
+    import time
+
+    for name in STANDARD_GROUPS:
+        p, g, q = standard_group(name)
+        assert miller_rabin(q, 8) and miller_rabin(p, 8), name
+        assert powmod(g, q, p) == 1, name
+        print(f"{name}: {p.bit_length()}-bit safe prime ok")
+
+    for bits in [256, 512, 1024]:
+        st = time.time()
+        p = find_safe_prime(bits)
+        assert p.bit_length() == bits and miller_rabin((p - 1) // 2, 8)
+        print(f"{bits}-bit safe prime: {time.time() - st:.3f} s")
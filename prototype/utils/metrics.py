@@ -0,0 +1,82 @@
+# 密码学操作的性能统计
+# 每个线程只写自己的统计表（热路径上无锁），读取时合并所有线程的结果
+
+# 系统库
+import threading
+
+# 耗时直方图的桶数：第i个桶统计耗时在[2^(i-1), 2^i)纳秒内的操作，最后一个桶收纳更长的耗时
+HIST_BUCKETS = 40
+
+
+class Metrics:
+    """按操作名统计调用次数、处理的分块数、总耗时及log2耗时直方图"""
+
+    def __init__(self):
+        self.__local = threading.local()
+        self.__shards = []  # 所有线程的统计表
+        self.__shards_lock = threading.Lock()  # 仅在线程首次记录和读取时使用
+
+    def __shard(self):
+        shard = getattr(self.__local, "shard", None)
+        if shard is None:
+            shard = {}
+            self.__local.shard = shard
+            with self.__shards_lock:
+                self.__shards.append(shard)
+        return shard
+
+    def record(self, op, elapsed_ns, blocks=0):
+        """记录一次操作，elapsed_ns为time.perf_counter_ns()测得的耗时"""
+        shard = self.__shard()
+        stat = shard.get(op)
+        if stat is None:
+            # [次数, 分块数, 总耗时(ns), 直方图]
+            stat = shard[op] = [0, 0, 0, [0] * HIST_BUCKETS]
+        stat[0] += 1
+        stat[1] += blocks
+        stat[2] += elapsed_ns
+        stat[3][min(elapsed_ns.bit_length(), HIST_BUCKETS - 1)] += 1
+
+    def __merged(self):
+        with self.__shards_lock:
+            shards = list(self.__shards)
+        merged = {}
+        for shard in shards:
+            for op, (count, blocks, total_ns, hist) in list(shard.items()):
+                m = merged.setdefault(op, [0, 0, 0, [0] * HIST_BUCKETS])
+                m[0] += count
+                m[1] += blocks
+                m[2] += total_ns
+                m[3] = [a + b for a, b in zip(m[3], hist)]
+        return merged
+
+    @staticmethod
+    def __quantile(hist, count, q):
+        # 按直方图估计分位数，返回所在桶的上界（毫秒）
+        target = q * count
+        seen = 0
+        for i, n in enumerate(hist):
+            seen += n
+            if n and seen >= target:
+                return (1 << i) / 1e6
+        return 0.0
+
+    def snapshot(self) -> dict:
+        """返回 {操作名: 统计结果}，耗时单位为毫秒"""
+        ret = {}
+        for op, (count, blocks, total_ns, hist) in self.__merged().items():
+            ret[op] = {
+                "count": count,
+                "blocks": blocks,
+                "total_ms": total_ns / 1e6,
+                "mean_ms": total_ns / count / 1e6 if count else 0.0,
+                "p50_ms": self.__quantile(hist, count, 0.5),
+                "p99_ms": self.__quantile(hist, count, 0.99),
+                # 直方图：{桶上界(ns): 次数}，省略空桶
+                "histogram": {1 << i: n for i, n in enumerate(hist) if n},
+            }
+        return ret
+
+    def total_seconds(self) -> float:
+        """所有操作的总耗时（秒）"""
+        return sum(stat[2] for stat in self.__merged().values()) / 1e9
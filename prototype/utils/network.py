@@ -1,55 +1,138 @@
+from prototype.utils import framing, rpc_codec, transport
+
 import socket
 import threading
 import pickle
-import struct
+import weakref
+
+# 接收帧的长度上限（字节），None表示不限制，见set_max_frame_size
+MAX_FRAME_SIZE = None
+
+# 发送消息时优先使用的编码："binary"（utils.rpc_codec）或"pickle"，见set_codec
+CODEC = "binary"
+
+# 严格模式：只收发rpc_codec消息，拒绝pickle帧（pickle.loads会执行对端构造的代码），见set_codec
+STRICT = True
+
+# 按连接记录对端最近一次发来的消息编码，回复时沿用，从而与只支持pickle的对端自动协商
+# 接收方按负载首字节识别编码，因此每条消息都可以独立地退回pickle
+_peer_codecs = weakref.WeakKeyDictionary()
+
+
+def set_max_frame_size(max_size):
+    """设置recvLine接受的最大帧长度，超过时抛出framing.FrameTooLarge；0或None表示不限制"""
+    global MAX_FRAME_SIZE
+    MAX_FRAME_SIZE = max_size or None
+
+
+def set_codec(codec, strict=None):
+    """设置发送消息时优先使用的编码，rpc_codec无法表示的消息仍使用pickle
+
+    strict为True时（codec为binary时默认开启）不再退回pickle：
+    接收到非rpc_codec的帧时抛出rpc_codec.DecodeError，发送无法表示的消息时抛出UnsupportedType
+    """
+    global CODEC, STRICT
+    if codec not in ("binary", "pickle"):
+        raise ValueError(f"unknown message codec: {codec}")
+    if strict is None:
+        strict = codec == "binary"
+    if strict and codec != "binary":
+        raise ValueError("strict mode requires the binary codec")
+    CODEC = codec
+    STRICT = strict
+
+
+def configure(network_config):
+    """按配置文件的network部分设置帧长度上限和消息编码"""
+    set_max_frame_size(network_config.get("max_frame_size"))
+    set_codec(
+        network_config.get("codec") or "binary", network_config.get("strict_codec")
+    )
+
+
+def encode_message(s, data):
+    """按连接s上协商的编码序列化data"""
+    if STRICT:
+        return rpc_codec.dumps(data)
+    if _peer_codecs.get(s, CODEC) == "binary":
+        try:
+            return rpc_codec.dumps(data)
+        except rpc_codec.UnsupportedType:
+            pass
+    return pickle.dumps(data)
+
+
+def decode_message(s, line):
+    """按首字节识别编码并反序列化，同时记录对端使用的编码"""
+    if rpc_codec.is_encoded(line):
+        _peer_codecs[s] = "binary"
+        return rpc_codec.loads(line)
+    if STRICT:
+        raise rpc_codec.DecodeError("non-binary message rejected in strict mode")
+    _peer_codecs[s] = "pickle"
+    return pickle.loads(line)
 
 
 def recvAll(s, length):
     """接收指定长度的数据"""
-    data = b""
-    while len(data) < length:
-        more = s.recv(length - len(data))
-        if not more:
-            raise EOFError(
-                "socket closed {} bytes into a {}-byte message".format(
-                    len(data), length
-                )
-            )
-        data += more
-    return data
+    return framing.recv_exact(s, length)
 
 
 def recvLine(s):
     """接收一行数据，以长度为前缀"""
-    # 首先接收4个字节的长度信息
-    lengthbuf = recvAll(s, 4)
-    (length,) = struct.unpack("!I", lengthbuf)
-    line = recvAll(s, length)
+    # 按长度前缀一次性分配缓冲区并直接写入
+    line = framing.recv_frame(s, MAX_FRAME_SIZE)
 
     try:
         # 反序列化数据
-        return pickle.loads(line)
+        return decode_message(s, line)
     except pickle.UnpicklingError:
         # 如果反序列化失败，返回原始字节数据
         print("r pickle error", line)
-        return line
+        return bytes(line)
 
 
 def sendLine(s, data):
     """发送一行数据，以长度为前缀"""
     try:
         # 尝试序列化数据
-        serialized_data = pickle.dumps(data)
+        serialized_data = encode_message(s, data)
+    except rpc_codec.UnsupportedType:
+        raise
     except TypeError:
         # 如果无法序列化，则假定数据已经是字节类型
         serialized_data = data
         print("s pickle error", data)
 
-    # 发送数据长度信息
-    length = len(serialized_data)
-    s.sendall(struct.pack("!I", length))
-    # 发送数据
-    s.sendall(serialized_data)
+    # 长度信息与数据通过一次sendmsg发送
+    framing.send_frame(s, serialized_data)
+
+
+def _dispatch(handler, conn, addr):
+    # 首字节为0xff的是多路复用连接（见utils.transport），每个虚拟连接分别调用handler
+    # 旧协议的首字节是长度前缀的最高字节，除超过4 GiB的帧（前缀为framing.ESCAPE）外恒为0x00
+    # 据此判断协议要求客户端先发送，处理函数不能在收到请求前先发送数据
+    try:
+        first = conn.recv(1, socket.MSG_PEEK)
+        if first == transport.MAGIC[:1]:
+            first = conn.recv(
+                len(transport.MAGIC), socket.MSG_PEEK | socket.MSG_WAITALL
+            )
+    except OSError:
+        conn.close()
+        return
+    if first == transport.MAGIC:
+        recvAll(conn, len(transport.MAGIC))
+        transport.serve(conn, addr, handler)
+    elif first:
+        try:
+            handler(conn, addr)
+        except framing.FrameTooLarge:
+            # 不读取超长的负载，直接断开，对端随即收到EOF
+            conn.close()
+            raise
+    else:
+        conn.close()
 
 
 def listen_on_port(handler, port, isAsync=True):
@@ -59,8 +142,9 @@ def listen_on_port(handler, port, isAsync=True):
             # 异步处理
             if isAsync:
                 threading.Thread(
-                    target=handler,
+                    target=_dispatch,
                     args=(
+                        handler,
                         conn,
                         addr,
                     ),
@@ -0,0 +1,79 @@
+# 添加当前路径至解释器，确保单元测试时可正常import其它文件
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# 基于顶层包的import
+from utils.elgamal import ElGamal
+
+# 系统库
+import queue
+import threading
+
+
+class RandomnessPool:
+    """(alpha, E(0, alpha)) 预计算池
+
+    E(0, alpha) = (h^alpha, g^alpha)，按公钥所属的方案（pk.scheme）计算，
+    后台线程在节点空闲时填充有界队列，消费者O(1)取出，池为空时退回同步计算
+    """
+
+    def __init__(self, pk, capacity, gen=ElGamal.genAlpha):
+        self.pk = pk
+        self.capacity = capacity
+        self.gen = gen  # 随机数生成函数，如ElGamal.genAlpha、ElGamal.genNonce
+        self.pool = queue.Queue(maxsize=capacity)
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()  # 多个请求线程同时取用时保护命中计数
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def compute(self):
+        alpha = self.gen(self.pk)
+        return alpha, self.pk.scheme.EncryptZero(self.pk, alpha)
+
+    def start(self):
+        if self.__thread is None and self.capacity > 0:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__producer, daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__thread = None
+
+    def __producer(self):
+        # 队列已满时阻塞在put上，直到有消费者取走
+        while not self.__stop.is_set():
+            item = self.compute()
+            while not self.__stop.is_set():
+                try:
+                    self.pool.put(item, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+    def take(self):
+        try:
+            item = self.pool.get_nowait()
+        except queue.Empty:
+            with self.__lock:
+                self.misses += 1
+            return self.compute()
+        with self.__lock:
+            self.hits += 1
+        return item
+
+    def stats(self):
+        with self.__lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "capacity": self.capacity,
+            "available": self.pool.qsize(),
+            "hits": hits,
+            "misses": misses,
+        }
@@ -0,0 +1,385 @@
+# 多路复用的持久连接
+# 每个进程对每个对端(ip, port)只保持一条TCP连接，每次调用在其上打开一个虚拟连接（流），
+# 流实现了sendall/recv/recv_into/close，可直接传给sendLine/recvLine，处理函数无需修改
+#
+# 连接建立后客户端先发送魔数MAGIC，之后双方只收发帧：
+#   类型(1B) | 流ID(4B) | 负载长度(4B) | 负载
+# 流ID由客户端分配（单调递增，即请求ID），OPEN帧打开流，服务端随即以该流调用处理函数；
+# DATA帧承载流中的数据，CLOSE帧表示发送方关闭该流；PING/PONG用于保活
+# 原有协议的首个字节是长度前缀的最高字节（恒为0x00），服务端据此与MAGIC区分，兼容旧客户端
+
+# 基于顶层包的import
+from prototype.utils import framing
+
+# 系统库
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+MAGIC = b"\xffMX1"
+FRAME = struct.Struct("!BII")
+
+OPEN = 0
+DATA = 1
+CLOSE = 2
+PING = 3
+PONG = 4
+
+# 空闲超过该时间（秒）的连接发送PING
+KEEPALIVE_INTERVAL = 10
+# 超过该时间（秒）未收到对端任何帧的连接视为断开，下次调用时重连
+KEEPALIVE_TIMEOUT = 30
+
+
+class Stream:
+    """多路复用连接上的一个虚拟连接，接口与socket的收发部分一致"""
+
+    def __init__(self, connection, stream_id):
+        self.connection = connection
+        self.stream_id = stream_id
+        self.__buffer = bytearray()
+        self.__cond = threading.Condition()
+        self.__remote_closed = False  # 对端已关闭（或连接断开），缓冲区读完后recv返回b""
+        self.__local_closed = False
+
+    # 由连接的读线程调用
+    def _feed(self, data):
+        with self.__cond:
+            self.__buffer += data
+            self.__cond.notify_all()
+
+    def _remote_close(self):
+        with self.__cond:
+            self.__remote_closed = True
+            self.__cond.notify_all()
+
+    def sendall(self, data):
+        if self.__local_closed:
+            raise OSError(f"stream {self.stream_id} is closed")
+        self.connection.send_frame(DATA, self.stream_id, data)
+
+    def sendmsg(self, buffers):
+        # 多个缓冲区作为一个DATA帧发送（如sendLine的长度前缀与负载）
+        if self.__local_closed:
+            raise OSError(f"stream {self.stream_id} is closed")
+        self.connection.send_frame(DATA, self.stream_id, *buffers)
+        return sum(len(b) for b in buffers)
+
+    def recv(self, bufsize):
+        with self.__cond:
+            while not self.__buffer and not self.__remote_closed:
+                self.__cond.wait()
+            data = bytes(self.__buffer[:bufsize])
+            del self.__buffer[:bufsize]
+            return data
+
+    def recv_into(self, buffer, nbytes=0):
+        view = memoryview(buffer).cast("B")
+        nbytes = nbytes or len(view)
+        with self.__cond:
+            while not self.__buffer and not self.__remote_closed:
+                self.__cond.wait()
+            n = min(nbytes, len(self.__buffer))
+            view[:n] = self.__buffer[:n]
+            del self.__buffer[:n]
+            return n
+
+    def close(self):
+        if self.__local_closed:
+            return
+        self.__local_closed = True
+        self.connection.release(self.stream_id)
+        try:
+            self.connection.send_frame(CLOSE, self.stream_id)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class MuxConnection:
+    """一条多路复用的TCP连接：读线程按流ID分发帧，发送时整帧加锁写入"""
+
+    def __init__(self, sock, on_open=None):
+        self.sock = sock
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # 服务端收到OPEN帧时的回调，客户端为None
+        self.on_open = on_open
+        self.streams = {}
+        self.streams_lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.next_id = 1
+        self.max_remote_id = 0
+        self.closed = False
+        self.last_recv = self.last_send = time.monotonic()
+
+    def __write(self, frame_type, stream_id, *buffers):
+        # 调用方须持有send_lock；帧头与负载通过一次sendmsg写出
+        length = sum(len(b) for b in buffers)
+        header = FRAME.pack(frame_type, stream_id, length)
+        framing.sendmsg_all(self.sock, [header, *buffers])
+        self.last_send = time.monotonic()
+
+    def send_frame(self, frame_type, stream_id, *buffers):
+        with self.send_lock:
+            self.__write(frame_type, stream_id, *buffers)
+
+    def open_stream(self):
+        # 分配ID与发送OPEN帧在同一把锁内完成，保证对端收到的流ID单调递增
+        with self.send_lock:
+            with self.streams_lock:
+                stream_id = self.next_id
+                self.next_id += 1
+                stream = Stream(self, stream_id)
+                self.streams[stream_id] = stream
+            try:
+                self.__write(OPEN, stream_id)
+            except OSError:
+                self.release(stream_id)
+                self.close()
+                raise
+        return stream
+
+    def release(self, stream_id):
+        with self.streams_lock:
+            self.streams.pop(stream_id, None)
+
+    def read_loop(self):
+        # 连接断开时所有未关闭的流均收到EOF
+        try:
+            while True:
+                frame_type, stream_id, length = FRAME.unpack(
+                    framing.recv_exact(self.sock, FRAME.size)
+                )
+                payload = framing.recv_exact(self.sock, length) if length else b""
+                self.last_recv = time.monotonic()
+                if frame_type == DATA:
+                    stream = self.streams.get(stream_id)
+                    if stream is not None:
+                        stream._feed(payload)
+                elif frame_type == OPEN:
+                    # 流ID单调递增，已关闭的流不会被重新打开
+                    if self.on_open is not None and stream_id > self.max_remote_id:
+                        self.max_remote_id = stream_id
+                        stream = Stream(self, stream_id)
+                        with self.streams_lock:
+                            self.streams[stream_id] = stream
+                        self.on_open(stream)
+                elif frame_type == CLOSE:
+                    stream = self.streams.get(stream_id)
+                    if stream is not None:
+                        stream._remote_close()
+                elif frame_type == PING:
+                    self.send_frame(PONG, 0)
+        except (OSError, EOFError, struct.error):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        with self.streams_lock:
+            streams = list(self.streams.values())
+            self.streams.clear()
+        for stream in streams:
+            stream._remote_close()
+
+
+class WorkerPool:
+    """按需增长的线程池：有空闲线程时复用，否则新建，空闲超过idle_timeout秒的线程退出
+
+    处理函数可能长时间阻塞（如等待后续请求），因此不限制线程数
+    """
+
+    def __init__(self, idle_timeout=KEEPALIVE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.reset()
+
+    def reset(self):
+        # fork出的子进程中没有父进程的空闲线程，须清空计数，否则任务不会被执行
+        self.tasks = queue.SimpleQueue()
+        self.idle = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self.lock:
+            spawn = not self.idle
+            if not spawn:
+                self.idle -= 1
+            self.tasks.put((fn, args))
+        if spawn:
+            threading.Thread(target=self.__worker, daemon=True).start()
+
+    def __worker(self):
+        while True:
+            try:
+                fn, args = self.tasks.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self.lock:
+                    # 退出前再次确认没有分配给本线程的任务
+                    if self.tasks.empty():
+                        self.idle -= 1
+                        return
+                continue
+            try:
+                fn(*args)
+            finally:
+                with self.lock:
+                    self.idle += 1
+
+
+# 服务端处理各个流的线程池，进程内共享
+_workers = WorkerPool()
+
+
+def serve(conn, addr, handler):
+    """服务端：在已读取MAGIC的连接上为每个流调用handler(stream, addr)，返回时关闭该流"""
+    # 客户端空闲时会定期发送PING，长时间收不到任何帧说明连接已失效
+    conn.settimeout(KEEPALIVE_TIMEOUT)
+
+    def run(stream):
+        try:
+            handler(stream, addr)
+        finally:
+            stream.close()
+
+    connection = MuxConnection(conn, on_open=lambda stream: _workers.submit(run, stream))
+    connection.read_loop()
+
+
+class ConnectionPool:
+    """客户端：按对端缓存多路复用连接，断开后在下次调用时自动重连"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # 只丢弃引用而不关闭连接：fork出的子进程与父进程共享这些socket，关闭会影响父进程
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.__keepalive_thread = None
+
+    def __connect(self, ip, port):
+        sock = socket.create_connection((ip, port))
+        sock.sendall(MAGIC)
+        connection = MuxConnection(sock)
+        threading.Thread(target=connection.read_loop, daemon=True).start()
+        return connection
+
+    def get(self, ip, port):
+        key = (ip, port)
+        with self.lock:
+            connection = self.connections.get(key)
+            if connection is None or connection.closed:
+                connection = self.__connect(ip, port)
+                self.connections[key] = connection
+            if self.__keepalive_thread is None:
+                self.__keepalive_thread = threading.Thread(
+                    target=self.__keepalive, daemon=True
+                )
+                self.__keepalive_thread.start()
+        return connection
+
+    def open_stream(self, ip, port):
+        # 连接已失效（如对端重启）导致打开失败时重连一次；流打开后出错则不重试，由调用方处理
+        try:
+            return self.get(ip, port).open_stream()
+        except OSError:
+            return self.get(ip, port).open_stream()
+
+    def connect_to(self, handler, port, ip="localhost"):
+        with self.open_stream(ip, port) as stream:
+            return handler(stream)
+
+    def __keepalive(self):
+        while True:
+            time.sleep(KEEPALIVE_INTERVAL / 2)
+            now = time.monotonic()
+            with self.lock:
+                connections = list(self.connections.items())
+            for key, connection in connections:
+                if connection.closed:
+                    with self.lock:
+                        if self.connections.get(key) is connection:
+                            del self.connections[key]
+                elif now - connection.last_recv > KEEPALIVE_TIMEOUT:
+                    connection.close()
+                elif now - max(connection.last_recv, connection.last_send) > (
+                    KEEPALIVE_INTERVAL
+                ):
+                    try:
+                        connection.send_frame(PING, 0)
+                    except OSError:
+                        connection.close()
+
+    def close(self):
+        with self.lock:
+            connections = list(self.connections.values())
+            self.connections.clear()
+        for connection in connections:
+            connection.close()
+
+
+# 进程内共享的连接池
+_pool = ConnectionPool()
+
+
+def connect_to(handler, port, ip="localhost"):
+    """与network.connect_to用法相同，handler收到的是复用连接上的虚拟连接"""
+    return _pool.connect_to(handler, port, ip)
+
+
+def _reset_after_fork():
+    # fork出的子进程（如multiprocessing启动的节点）继承了模块级的状态，但没有其中的线程：
+    # 父进程的工作线程、连接的读线程和保活线程都不存在，锁也可能处于被持有的状态
+    _workers.reset()
+    _pool.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+if __name__ == "__main__":
+    # 对比每次调用新建TCP连接与复用连接的小消息往返耗时
+    import sys
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    from prototype.utils import network
+
+    PORT = 44446
+
+    def echo_server(conn, addr):
+        network.sendLine(conn, network.recvLine(conn))
+        conn.close()
+
+    threading.Thread(
+        target=network.listen_on_port, args=(echo_server, PORT), daemon=True
+    ).start()
+    time.sleep(0.2)
+
+    def handler(conn):
+        network.sendLine(conn, "ping")
+        return network.recvLine(conn)
+
+    rounds = 1000
+    for name, call in [("connect-per-call", network.connect_to), ("pooled", connect_to)]:
+        st = time.time()
+        for _ in range(rounds):
+            assert call(handler, PORT) == "ping"
+        print(f"{name}: {(time.time() - st) / rounds * 1e6:.1f} us per call")
+    _pool.close()
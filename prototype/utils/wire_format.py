@@ -0,0 +1,142 @@
+# 添加当前路径至解释器，确保单元测试时可正常import其它文件
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+# 基于顶层包的import
+from utils.elgamal import ElGamal
+
+# 系统库
+import struct
+
+# 密文向量的二进制格式（所有整数均为大端）
+# 头部：魔数(4B) | 版本(1B) | 标志位(1B) | 公钥指纹(32B) | 元素宽度(2B) | 密文数量(4B)
+# 主体：count个密文，每个为定宽的 cm || cr
+# 群元素的编码由公钥决定（pk.encode_element）：MODP群为按p宽度的整数，椭圆曲线为压缩点
+# 可选尾部（FLAG_PROOF）：非交互式重加密证明 e'.cm || e'.cr || len(beta)(2B) || beta
+MAGIC = b"RFCV"
+VERSION = 1
+FLAG_PROOF = 0x01
+HEADER = struct.Struct("!4sBB32sHI")
+BETA_LEN = struct.Struct("!H")
+
+
+def dumps(ciphertexts, pk, proof=None) -> bytes:
+    """将密文向量（及可选的非交互式证明(cm, cr, beta)）编码为字节串"""
+    ciphertexts = pk.scheme.CiphertextVector.of(ciphertexts, pk)
+    width = pk.element_size
+    encode = pk.encode_element
+    n = len(ciphertexts)
+    size = HEADER.size + 2 * width * n
+    if proof is not None:
+        beta = int(proof[2]).to_bytes((int(proof[2]).bit_length() + 7) // 8, "big")
+        size += 2 * width + BETA_LEN.size + len(beta)
+    buf = bytearray(size)
+    HEADER.pack_into(
+        buf,
+        0,
+        MAGIC,
+        VERSION,
+        FLAG_PROOF if proof is not None else 0,
+        pk.fingerprint(),
+        width,
+        n,
+    )
+    offset = HEADER.size
+    for cm, cr in zip(ciphertexts.cm, ciphertexts.cr):
+        buf[offset : offset + width] = encode(cm)
+        buf[offset + width : offset + 2 * width] = encode(cr)
+        offset += 2 * width
+    if proof is not None:
+        buf[offset : offset + width] = encode(proof[0])
+        buf[offset + width : offset + 2 * width] = encode(proof[1])
+        offset += 2 * width
+        BETA_LEN.pack_into(buf, offset, len(beta))
+        offset += BETA_LEN.size
+        buf[offset:] = beta
+    return bytes(buf)
+
+
+def loads(data, pk):
+    """从字节串解析密文向量，返回(ciphertexts, proof)，没有证明时proof为None
+
+    直接在memoryview上按偏移解析，不复制输入；公钥指纹不一致时报错
+    """
+    mv = memoryview(data)
+    if len(mv) < HEADER.size:
+        raise ValueError(f"truncated ciphertext vector: {len(mv)} bytes")
+    magic, version, flags, fingerprint, width, n = HEADER.unpack_from(mv, 0)
+    if magic != MAGIC:
+        raise ValueError(f"bad ciphertext vector magic: {bytes(magic)!r}")
+    if version != VERSION:
+        raise ValueError(f"unsupported ciphertext vector version: {version}")
+    if fingerprint != pk.fingerprint():
+        raise ValueError("ciphertext vector was produced under a different public key")
+    if width != pk.element_size:
+        raise ValueError(f"element width {width} does not match the public key")
+
+    body_end = HEADER.size + 2 * width * n
+    if len(mv) < body_end:
+        raise ValueError(f"truncated ciphertext vector: {len(mv)} < {body_end} bytes")
+    decode = pk.decode_element
+
+    def read(offset, subgroup=False):
+        return decode(mv[offset : offset + width], subgroup)
+
+    # 密文的cr和证明中的e'须在子群中，cm承载明文，不作要求
+    cm, cr = [], []
+    for offset in range(HEADER.size, body_end, 2 * width):
+        cm.append(read(offset))
+        cr.append(read(offset + width, True))
+    ciphertexts = pk.scheme.CiphertextVector(cm, cr, pk)
+
+    proof = None
+    offset = body_end
+    if flags & FLAG_PROOF:
+        if len(mv) < offset + 2 * width + BETA_LEN.size:
+            raise ValueError("truncated re-encryption proof")
+        cm, cr = read(offset, True), read(offset + width, True)
+        offset += 2 * width
+        (beta_len,) = BETA_LEN.unpack_from(mv, offset)
+        offset += BETA_LEN.size
+        if len(mv) < offset + beta_len:
+            raise ValueError("truncated re-encryption proof")
+        beta = int.from_bytes(mv[offset : offset + beta_len], "big")
+        offset += beta_len
+        proof = (cm, cr, beta)
+    if offset != len(mv):
+        raise ValueError(f"{len(mv) - offset} trailing bytes after ciphertext vector")
+    return ciphertexts, proof
+
+
+if __name__ == "__main__":
+    # 与原有JSON字符串格式的体积和解析耗时对比
+    import pickle
+    import time
+    from utils.elgamal_encryptor import ElgamalEncryptor
+
+    pk, sk = ElGamal.KeyGen(256, 32)
+    encryptor = ElgamalEncryptor(str(pk), str(sk))
+    cts = encryptor.encrypt(os.urandom(4000))
+    proof = (int(cts[0].cm), int(cts[0].cr), 12345)
+
+    data = dumps(cts, pk, proof)
+    loaded, loaded_proof = loads(data, pk)
+    assert loaded == cts and loaded_proof == proof
+    legacy = pickle.dumps({"ciphertexts": [str(c) for c in cts], "proof": proof})
+
+    rounds = 20
+    st = time.time()
+    for _ in range(rounds):
+        loads(data, pk)
+    new_time = (time.time() - st) / rounds
+    st = time.time()
+    for _ in range(rounds):
+        [ElGamal.Ciphertext.from_str(c) for c in pickle.loads(legacy)["ciphertexts"]]
+    old_time = (time.time() - st) / rounds
+
+    print(f"{len(cts)} ciphertexts: binary {len(data)} B, legacy {len(legacy)} B")
+    print(f"parse: binary {new_time * 1000:.3f} ms, legacy {old_time * 1000:.3f} ms")